@@ -0,0 +1,245 @@
+import configparser
+import csv
+import gzip
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import sqlite3
+from Local_DB_Lite import sqlite_path_from_url
+
+# Standard library only, like Local_DB_Lite: it runs on the edge devices next to the collector.
+
+
+class buffer_retention():
+    """
+    This class keeps the counts table of the local sqlite buffer under a disk quota. When that table (with its
+    indexes) exceeds quota_mb, the oldest polls are compacted, either moved to gzip compressed csv archive segments
+    (drained later by remote_db.push_backlog) or downsampled to one row per AP and hour, and the freed pages are
+    returned to the filesystem with incremental vacuum. The other buffer tables (sessions, dwell) and the archive
+    segments are not counted against the quota: they are bounded by the push draining them.
+    """
+
+    def __init__(self, project_path = ".", config_file="config.ini"):
+
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/buffer_retention.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+        """
+        read config file
+        """
+        self.config_file = config_file
+        if not os.path.exists(self.project_path+"/"+self.config_file):
+            self.logger.error("cannot find config_file={}".format(self.config_file))
+            raise Exception("config file not found")
+
+        Config = configparser.ConfigParser()
+        Config.read(self.project_path+"/"+self.config_file)
+        self.logger.info("successfully loaded config_file={}".format(self.config_file))
+
+        try:
+            self.local_db = Config.get('local_db', 'filename')
+            self.table = Config.get('local_db', 'table')
+            self.quota_bytes = int(Config.getfloat('local_db', 'quota_mb', fallback=0) * 1024 * 1024)
+            self.compaction = Config.get('local_db', 'compaction', fallback="archive")
+            self.compact_fraction = Config.getfloat('local_db', 'compact_fraction', fallback=0.1)
+            self.vacuum_pages = Config.getint('local_db', 'vacuum_pages', fallback=1024)
+            self.archive_dir = self.project_path+"/"+Config.get('local_db', 'archive_dir', fallback="archive")
+        except Exception as e:
+            self.logger.error("unexpected error while setting configuration from config_file={}, error={}".format(self.config_file, str(e)))
+            raise e
+
+        if self.compaction not in ("archive", "downsample"):
+            raise Exception("compaction must be archive or downsample")
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+
+        # autocommit mode: transactions are opened explicitly around each compaction
+        self.connection = sqlite3.connect(sqlite_path_from_url(self.local_db, self.project_path), isolation_level=None)
+        self.vacuum_pending = False
+        self.incremental_vacuum = self.enable_incremental_vacuum()
+
+    def enable_incremental_vacuum(self):
+
+        """
+        this method switches the buffer to auto_vacuum=INCREMENTAL; an existing file needs one full VACUUM for it.
+        VACUUM may renumber the rowids the push cursor relies on (the buffer tables have no INTEGER PRIMARY KEY), so
+        it only runs on an empty buffer, and it fails while another process (e.g. push_service.py) uses the file;
+        it tells whether the switch is done and enforce_quota retries it
+        """
+        try:
+            if self.connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return True
+            tables = [row[0] for row in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+            if any(self.connection.execute('SELECT 1 FROM "{}" LIMIT 1'.format(t)).fetchone() for t in tables):
+                if not self.vacuum_pending:
+                    self.logger.info("local db will switch to incremental auto vacuum once the buffer has been pushed")
+                    self.vacuum_pending = True
+                return False
+            self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.connection.execute("VACUUM")
+            self.logger.info("local db switched to incremental auto vacuum")
+            return True
+        except sqlite3.OperationalError as e:
+            self.logger.warning("cannot switch local db to incremental auto vacuum yet, will retry, error={}".format(str(e)))
+            return False
+
+    def _table_exists(self):
+        return self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (self.table,)
+        ).fetchone() is not None
+
+    def _table_bytes(self, live_bytes, rows):
+
+        """
+        this method returns the bytes of the pages of the counts table and its indexes; without the dbstat virtual
+        table (sqlite built without SQLITE_ENABLE_DBSTAT_VTAB) it estimates them from its share of the buffered rows
+        """
+        try:
+            return self.connection.execute(
+                "SELECT coalesce(sum(pgsize), 0) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = ?)",
+                (self.table,)
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            tables = [row[0] for row in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+            all_rows = sum(self.connection.execute('SELECT count(*) FROM "{}"'.format(t)).fetchone()[0] for t in tables)
+            return live_bytes * rows // all_rows if all_rows else 0
+
+    def buffer_stats(self):
+
+        """
+        this method returns the sizes of the buffer: db file, free pages, live data, counts table (what quota_mb
+        bounds), rows of the counts table, archive segments
+        """
+        page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self.connection.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+        rows = self.connection.execute('SELECT count(*) FROM "{}"'.format(self.table)).fetchone()[0] if self._table_exists() else 0
+        live_bytes = (page_count - free_pages) * page_size
+        segments = self.archive_segments()
+        return {
+            "db_bytes": page_count * page_size,
+            "free_bytes": free_pages * page_size,
+            "live_bytes": live_bytes,
+            "table_bytes": self._table_bytes(live_bytes, rows) if rows else 0,
+            "rows": rows,
+            "archive_segments": len(segments),
+            "archive_bytes": sum(os.path.getsize(s) for s in segments),
+        }
+
+    def archive_segments(self):
+
+        """
+        this method lists the archive segments, oldest first (their names start with the first ts they hold)
+        """
+        return sorted(
+            os.path.join(self.archive_dir, name) for name in os.listdir(self.archive_dir) if name.endswith(".csv.gz")
+        )
+
+    def _oldest_polls_cutoff(self):
+
+        """
+        this method returns the ts of the last poll in the oldest compact_fraction of the buffered polls
+        """
+        polls = self.connection.execute('SELECT count(DISTINCT ts) FROM "{}"'.format(self.table)).fetchone()[0]
+        if polls == 0:
+            return None
+        offset = max(int(polls * self.compact_fraction), 1) - 1
+        return self.connection.execute(
+            'SELECT DISTINCT ts FROM "{}" ORDER BY ts LIMIT 1 OFFSET ?'.format(self.table), (offset,)
+        ).fetchone()[0]
+
+    def archive_oldest(self, cutoff):
+
+        """
+        this method moves the rows with ts <= cutoff into a compressed archive segment; it returns the rows moved
+        """
+        rows = self.connection.execute(
+            'SELECT id, value, ts FROM "{}" WHERE ts <= ? ORDER BY ts, id'.format(self.table), (cutoff,)
+        ).fetchall()
+        if not rows:
+            return 0
+        filename = os.path.join(self.archive_dir, "segment_{}_{}.csv.gz".format(rows[0][2], rows[-1][2]))
+        tmp = filename + ".tmp"
+        with gzip.open(tmp, "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "value", "ts"])
+            writer.writerows(rows)
+        os.replace(tmp, filename)
+        # the segment is complete on disk before the rows leave the buffer
+        self.connection.execute("BEGIN")
+        self.connection.execute('DELETE FROM "{}" WHERE ts <= ?'.format(self.table), (cutoff,))
+        self.connection.execute("COMMIT")
+        self.logger.info("archived {} rows up to ts={} into {}".format(len(rows), cutoff, filename))
+        return len(rows)
+
+    def downsample_oldest(self, cutoff):
+
+        """
+        this method keeps only the last row of each AP in each hour among the rows with ts <= cutoff (controllers poll
+        at their own ts, so the hour is thinned per AP, not per poll); it returns the rows removed
+        """
+        self.connection.execute("BEGIN")
+        removed = self.connection.execute(
+            'DELETE FROM "{0}" WHERE ts <= ? AND rowid NOT IN '
+            '(SELECT max(rowid) FROM "{0}" WHERE ts <= ? GROUP BY id, substr(ts, 1, 10))'.format(self.table),
+            (cutoff, cutoff)
+        ).rowcount
+        self.connection.execute("COMMIT")
+        self.logger.info("downsampled rows up to ts={} to one row per AP and hour, {} rows removed".format(cutoff, removed))
+        return removed
+
+    def enforce_quota(self):
+
+        """
+        this method compacts the oldest polls until the counts table fits in quota_mb (or is empty), reclaims up to
+        vacuum_pages free pages and reports the buffer size and the compaction activity
+        """
+        stats = self.buffer_stats()
+        compacted = {"archived_rows": 0, "downsampled_rows": 0}
+        try:
+            while self.quota_bytes and stats["table_bytes"] > self.quota_bytes and stats["rows"] > 0:
+                cutoff = self._oldest_polls_cutoff()
+                if cutoff is None:
+                    break
+                removed = self.downsample_oldest(cutoff) if self.compaction == "downsample" else 0
+                compacted["downsampled_rows"] += removed
+                if removed == 0:
+                    # nothing left to downsample in this range: move it out of the buffer instead
+                    compacted["archived_rows"] += self.archive_oldest(cutoff)
+                stats = self.buffer_stats()
+
+            if not self.incremental_vacuum:
+                self.incremental_vacuum = self.enable_incremental_vacuum()
+            if stats["free_bytes"] and self.incremental_vacuum:
+                # the pragma frees one page per step: executescript steps it to completion, execute() would not
+                self.connection.executescript("PRAGMA incremental_vacuum({});".format(self.vacuum_pages))
+                stats = self.buffer_stats()
+        except Exception as e:
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            self.logger.error("unexpected error while compacting local db, error={}".format(str(e)))
+            raise e
+
+        stats.update(compacted)
+        self.logger.info("local buffer {}".format(", ".join("{}={}".format(k, v) for k, v in stats.items())))
+        return stats
+
+    def dispose(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+
+    retention = buffer_retention()
+    retention.enforce_quota()
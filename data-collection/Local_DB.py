@@ -1,5 +1,5 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.exc import SQLAlchemyError, DBAPIError
 import logging
 from logging.handlers import TimedRotatingFileHandler
@@ -46,6 +46,7 @@ class local_db():
         try:
             self.local_db = Config.get('local_db', 'filename')
             self.table = Config.get('local_db', 'table')
+            self.archive_dir = self.project_path+"/"+Config.get('local_db', 'archive_dir', fallback="archive")
         except Exception as e:
             self.logger.error("unexpected error while setting configuration from config_file={}, error={}".format(self.config_file, str(e)))
             raise e
@@ -72,24 +73,26 @@ class local_db():
             self.logger.error("cannot create sqlalchemy engine, error={}".format(str(e)))
             raise e
 
-    def save_to_local_DB(self, data, mode="append"):
+    def save_to_local_DB(self, data, mode="append", table=None, chunksize=None):
 
         """
         this method saves the data from a pandas dataframe into a db table, currently on disk
+        table defaults to the buffer table of the config file; chunksize writes the rows in batches of that size
         """
+        table = table or self.table
         try:
             if data.empty == False:
                 # TODO: apply mapping or filtering or data manipulations if any, none in this case right now
                 mapped_data = data
-                mapped_data.to_sql(name=self.table, con=self.engine, if_exists=mode, index=False)
-                self.logger.info("values successfully inserted into local database table {}".format(self.table))
+                mapped_data.to_sql(name=table, con=self.engine, if_exists=mode, index=False, chunksize=chunksize)
+                self.logger.info("values successfully inserted into local database table {}".format(table))
             else:
                 self.logger.warn("data to save to local datbase is None, check this")
         except ValueError as e:
-            self.logger.error("cannot insert values to table {}, data might already exist, error={}".format(self.table, str(e)))
+            self.logger.error("cannot insert values to table {}, data might already exist, error={}".format(table, str(e)))
             raise e
         except Exception as e:
-            self.logger.error("Unexpected error while appending values to local database table {}, error={}".format(self.table, str(e)))
+            self.logger.error("Unexpected error while appending values to local database table {}, error={}".format(table, str(e)))
             raise e
         return
 
@@ -106,6 +109,91 @@ class local_db():
             self.logger.error("The table {} was not found, error={}".format(self.table, str(e)))
             return pd.DataFrame()
 
+    def has_table(self, table=None):
+
+        """
+        this method tells whether a db table exists yet (the sessions and dwell tables appear with the first session)
+        """
+        return inspect(self.engine).has_table(table or self.table)
+
+    def read_local_DB_batch(self, after=None, batch_size=1000, table=None):
+
+        """
+        this method reads the next batch_size rows in insertion order, starting after the sqlite rowid `after`;
+        the rowid is returned in a _rowid column. table defaults to the buffer table of the config file
+        """
+        table = table or self.table
+        try:
+            query = "SELECT rowid AS _rowid, * FROM {} WHERE rowid > ? ORDER BY rowid LIMIT ?".format(table)
+            data = pd.read_sql_query(query, self.engine, params=(after or 0, batch_size))
+            self.logger.info("successfully read {} values from table {}".format(len(data), table))
+            return data
+        except Exception as e:
+            self.logger.error("The table {} was not found, error={}".format(table, str(e)))
+            return pd.DataFrame()
+
+    def read_key_at(self, rowid, table=None, key=("ts", "id")):
+
+        """
+        this method returns the natural key (ts, id by default) of the row at the sqlite rowid, None if that row no
+        longer exists
+        """
+        table = table or self.table
+        try:
+            row = self.engine.execute("SELECT {}, {} FROM {} WHERE rowid = ?".format(key[0], key[1], table), (rowid,)).fetchone()
+            return (str(row[0]), row[1]) if row is not None else None
+        except Exception as e:
+            self.logger.error("The table {} was not found, error={}".format(table, str(e)))
+            return None
+
+    def delete_data_up_to(self, last_rowid, table=None):
+
+        """
+        this method removes the rows up to and including the sqlite rowid of the last row sent
+        """
+        table = table or self.table
+        try:
+            self.engine.execute("DELETE FROM {} WHERE rowid <= ?".format(table), (last_rowid,))
+            self.logger.info("data up to rowid {} that was sent has been removed from the local db table {}".format(last_rowid, table))
+            return True
+
+        except Exception as e:
+            self.logger.error("unexpected error occured while removing data sent, error={}".format(str(e)))
+
+        return False
+
+    def archive_segments(self):
+
+        """
+        this method lists the compressed archive segments written by buffer_retention, oldest first
+        """
+        if not os.path.exists(self.archive_dir):
+            return []
+        return sorted(
+            os.path.join(self.archive_dir, name) for name in os.listdir(self.archive_dir) if name.endswith(".csv.gz")
+        )
+
+    def read_archive_segment(self, segment):
+
+        """
+        this method reads an archive segment back to a pandas dataframe with the columns of the db table
+        """
+        try:
+            data = pd.read_csv(segment, compression="gzip", dtype={"ts": str})
+            self.logger.info("successfully read {} values from archive segment {}".format(len(data), segment))
+            return data
+        except Exception as e:
+            self.logger.error("cannot read archive segment {}, error={}".format(segment, str(e)))
+            raise e
+
+    def delete_archive_segment(self, segment):
+
+        """
+        this method removes an archive segment that has been sent
+        """
+        os.remove(segment)
+        self.logger.info("archive segment {} that was sent has been removed".format(segment))
+
     def clean_local_DB(self):
 
         """
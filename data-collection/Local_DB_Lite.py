@@ -0,0 +1,118 @@
+import sqlite3
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import configparser
+
+# Standard library only: this module must stay importable on edge devices without pandas/sqlalchemy.
+
+
+def sqlite_path_from_url(url, project_path="."):
+
+    """
+    This function turns the sqlalchemy url of the [local_db] section into a path usable by sqlite3
+    """
+    path = url.format(project_path)
+    if path.startswith("sqlite:///"):
+        path = path[len("sqlite:///"):]
+    return path
+
+
+class local_db_lite():
+    """
+    This class saves (id, value, ts) rows to the local sqlite3 buffer with the same table layout that
+    local_db.save_to_local_DB produces from a pandas dataframe.
+    """
+
+    def __init__(self, project_path = ".", config_file="config.ini"):
+
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/local_db_lite.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+        """
+        read config file
+        """
+        self.config_file = config_file
+        if not os.path.exists(self.project_path+"/"+self.config_file):
+            self.logger.error("cannot find config_file={}".format(self.config_file))
+            raise Exception("config file not found")
+
+        Config = configparser.ConfigParser()
+        Config.read(self.project_path+"/"+self.config_file)
+        self.logger.info("successfully loaded config_file={}".format(self.config_file))
+
+        try:
+            self.local_db = Config.get('local_db', 'filename')
+            self.table = Config.get('local_db', 'table')
+        except Exception as e:
+            self.logger.error("unexpected error while setting configuration from config_file={}, error={}".format(self.config_file, str(e)))
+            raise e
+
+        self.connection = self.create_DB_connection()
+
+    def create_DB_connection(self):
+
+        """
+        this method opens a sqlite3 connection to the local db file
+        """
+
+        try:
+            connection = sqlite3.connect(sqlite_path_from_url(self.local_db, self.project_path))
+            self.logger.info("sqlite3 connection successfully created")
+            return connection
+
+        except sqlite3.Error as e:
+            self.logger.error("cannot create sqlite3 connection, error={}".format(str(e)))
+            raise e
+
+    def save_to_local_DB(self, rows, mode="append"):
+
+        """
+        this method saves (id, value, ts) rows into the db table; mode is "append" or "replace" as in DataFrame.to_sql
+        """
+        try:
+            if rows:
+                # pandas creates id as BIGINT when every AP id is an integer, FLOAT when they were read with NaNs, TEXT otherwise
+                if all(isinstance(row[0], int) for row in rows):
+                    id_type = "BIGINT"
+                elif all(isinstance(row[0], float) for row in rows):
+                    id_type = "FLOAT"
+                else:
+                    id_type = "TEXT"
+                with self.connection:
+                    if mode == "replace":
+                        self.connection.execute('DROP TABLE IF EXISTS "{}"'.format(self.table))
+                    self.connection.execute(
+                        'CREATE TABLE IF NOT EXISTS "{}" (id {}, value BIGINT, ts TEXT)'.format(self.table, id_type)
+                    )
+                    self.connection.executemany('INSERT INTO "{}" (id, value, ts) VALUES (?, ?, ?)'.format(self.table), rows)
+                self.logger.info("values successfully inserted into local database table {}".format(self.table))
+            else:
+                self.logger.warning("data to save to local datbase is None, check this")
+        except Exception as e:
+            self.logger.error("Unexpected error while appending values to local database table {}, error={}".format(self.table, str(e)))
+            raise e
+        return
+
+    def dispose_DB_engine(self):
+
+        """
+        this method closes the connection to the database
+        """
+        self.connection.close()
+        self.logger.info("closed sqlite3 connection")
+        return
+
+
+if __name__ == '__main__':
+
+    engine = local_db_lite()
@@ -0,0 +1,170 @@
+import configparser
+import datetime
+import json
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+
+def current_rss():
+
+    """
+    This function returns the resident set size of the process in bytes (0 where /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class memory_profiler():
+    """
+    This class records, per pipeline stage, the peak and the allocated (still held at the end) bytes, measured either
+    with tracemalloc (python allocations) or by sampling the RSS of the process. Each poll is written as one json line
+    to logs/<report>.jsonl, one file per process since each rotates it daily like the logs (report_backups days kept).
+    A stage whose peak exceeds its budget_<stage> (MB, [memory] section) marks the pipeline as over budget, which the
+    collector answers by switching to chunked/streaming processing.
+    """
+
+    def __init__(self, project_path = ".", config_file="config.ini", report="memory_report"):
+
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/memory_profiler.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+        """
+        read config file
+        """
+        self.config_file = config_file
+        if not os.path.exists(self.project_path+"/"+self.config_file):
+            self.logger.error("cannot find config_file={}".format(self.config_file))
+            raise Exception("config file not found")
+
+        Config = configparser.ConfigParser()
+        Config.read(self.project_path+"/"+self.config_file)
+        self.logger.info("successfully loaded config_file={}".format(self.config_file))
+
+        try:
+            self.enabled = Config.getboolean('memory', 'enabled', fallback=False)
+            self.method = Config.get('memory', 'method', fallback="tracemalloc")
+            self.sample_interval = Config.getfloat('memory', 'sample_interval', fallback=0.01)
+            self.chunksize = Config.getint('memory', 'chunksize', fallback=100000)
+            self.report_file = self.project_path+"/"+"logs/"+report+".jsonl"
+            self.report_backups = Config.getint('memory', 'report_backups', fallback=5)
+            self.budgets = {
+                key[len("budget_"):]: int(Config.getfloat('memory', key) * 1024 * 1024)
+                for key in (Config.options('memory') if Config.has_section('memory') else []) if key.startswith("budget_")
+            }
+        except Exception as e:
+            self.logger.error("unexpected error while setting configuration from config_file={}, error={}".format(self.config_file, str(e)))
+            raise e
+
+        if self.method not in ("tracemalloc", "rss"):
+            raise Exception("memory method must be tracemalloc or rss")
+        if self.enabled and self.method == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        """
+        the report is written through its own logger, one bare json line per record
+        """
+        self.report = logging.getLogger(__name__ + ".report")
+        self.report.setLevel(logging.INFO)
+        self.report.propagate = False
+        if self.enabled:
+            report_handler = TimedRotatingFileHandler(self.report_file, when='D', interval=1, backupCount=self.report_backups)
+            report_handler.setFormatter(logging.Formatter('%(message)s'))
+            self.report.addHandler(report_handler)
+
+        self.stages = {}            # stage -> {"peak_bytes", "allocated_bytes", "calls"} of the current poll
+        self.exceeded = set()       # stages that went over budget at least once, sticky for the process lifetime
+
+    def _sample_rss(self, stop, result):
+        while not stop.wait(self.sample_interval):
+            result[0] = max(result[0], current_rss())
+
+    @contextmanager
+    def stage(self, name):
+
+        """
+        this context manager measures one run of a pipeline stage; a stage entered several times in a poll (e.g. once
+        per chunk) reports its highest peak and the sum of its allocations
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if self.method == "tracemalloc":
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            before = current_rss()
+            result, stop = [before], threading.Event()
+            sampler = threading.Thread(target=self._sample_rss, args=(stop, result), daemon=True)
+            sampler.start()
+        try:
+            yield
+        finally:
+            if self.method == "tracemalloc":
+                after, peak = tracemalloc.get_traced_memory()
+            else:
+                stop.set()
+                sampler.join()
+                after = current_rss()
+                peak = max(result[0], after)
+            record = self.stages.setdefault(name, {"peak_bytes": 0, "allocated_bytes": 0, "calls": 0})
+            record["peak_bytes"] = max(record["peak_bytes"], peak - before)
+            record["allocated_bytes"] += after - before
+            record["calls"] += 1
+
+            budget = self.budgets.get(name)
+            if budget and peak - before > budget and name not in self.exceeded:
+                self.exceeded.add(name)
+                self.logger.warning("stage {} peaked at {} bytes over its budget of {} bytes, switching to chunked mode".format(
+                    name, peak - before, budget))
+
+    def over_budget(self, *stages):
+
+        """
+        this method tells whether any of the stages (all stages when none is given) has exceeded its budget
+        """
+        return bool(self.exceeded.intersection(stages) if stages else self.exceeded)
+
+    def clear(self, name):
+
+        """
+        this method forgets that a stage went over budget, e.g. once its batch size has been reduced
+        """
+        self.exceeded.discard(name)
+
+    def write_report(self, poll):
+
+        """
+        this method appends the measurements of the current poll to the report file and starts a new poll
+        """
+        if not self.enabled:
+            return
+        report = {
+            "ts": datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S"),
+            "poll": poll,
+            "method": self.method,
+            "rss_bytes": current_rss(),
+            "stages": self.stages,
+            "over_budget": sorted(self.exceeded),
+        }
+        try:
+            self.report.info(json.dumps(report))
+        except Exception as e:
+            self.logger.error("cannot write memory report to {}, error={}".format(self.report_file, str(e)))
+        self.stages = {}
@@ -0,0 +1,152 @@
+"""
+Vendor OIDs decoded by default_registry(); numeric OIDs as printed by snmpwalk -On
+"""
+ARUBA_USER_AP_NAME = "1.3.6.1.4.1.14823.2.2.1.4.1.2.1.10"       # wlsxUserTable, index = client mac (6) . client ip (4)
+ARUBA_AP_NAME = "1.3.6.1.4.1.14823.2.2.1.5.2.1.4.1.3"           # wlsxWlanAPTable wlanAPName, index = ap mac (6)
+ARUBA_RADIO_CLIENTS = "1.3.6.1.4.1.14823.2.2.1.5.2.1.5.1.7"     # wlsxWlanRadioTable wlanAPRadioNumAssociatedClients, index = ap mac (6) . radio
+CISCO_CLIENT_AP_MAC = "1.3.6.1.4.1.14179.2.1.4.1.4"             # bsnMobileStationAPMacAddr, index = client mac (6), value = ap mac (hex)
+CISCO_AP_NAME = "1.3.6.1.4.1.14179.2.2.1.1.3"                   # bsnAPName, index = ap mac (6)
+
+
+def split_walk_line(line):
+
+    """
+    This function splits one line of snmpwalk output (-Onaq) into (oid, value), keeping the whole value (e.g. the
+    space separated bytes of a Hex-STRING) and unquoting strings; it returns None when the line carries no value
+    """
+    parts = line.split(None, 1)
+    if len(parts) < 2:
+        return None
+    value = parts[1].strip()
+    if value[:1] == '"':
+        end = value.find('"', 1)
+        value = value[1:end] if end != -1 else value[1:]
+    if not value:
+        return None
+    return parts[0], value
+
+
+def _arcs(arcs, count):
+    # a truncated or overlong index would silently decode to a wrong mac/ip: the line is skipped instead
+    if len(arcs) != count or not all(arc.isdigit() and int(arc) < 256 for arc in arcs):
+        raise ValueError("expected {} index arcs, got {}".format(count, ".".join(arcs)))
+    return arcs
+
+
+def decode_client_ap(arcs, value):
+    arcs = _arcs(arcs, 10)
+    return ".".join(arcs[:6]), ".".join(arcs[6:]), value
+
+
+def decode_client_ap_mac(arcs, value):
+    hex_bytes = value.split()
+    if len(hex_bytes) != 6:
+        raise ValueError("expected a 6 byte mac, got {}".format(value))
+    return ".".join(_arcs(arcs, 6)), None, ":".join(b.lower() for b in hex_bytes)
+
+
+def decode_mac_value(arcs, value):
+    return ".".join(_arcs(arcs, 6)), value
+
+
+def decode_radio_clients(arcs, value):
+    arcs = _arcs(arcs, 7)
+    return ".".join(arcs[:6]), int(arcs[6]), int(value)
+
+
+class oid_trie():
+    """
+    This class is a prefix trie over OID arcs; each node may hold the entry registered for that OID prefix
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix, entry):
+
+        """
+        this method registers an entry for an OID prefix (leading dot optional)
+        """
+        node = self.root
+        for arc in prefix.strip(".").split("."):
+            node = node.setdefault(arc, {})
+        node[None] = entry
+
+    def longest_match(self, oid):
+
+        """
+        this method returns (entry, remaining index arcs) of the longest registered prefix of oid, or (None, None)
+        """
+        arcs = oid.strip(".").split(".")
+        node = self.root
+        found, depth = None, 0
+        for i, arc in enumerate(arcs):
+            node = node.get(arc)
+            if node is None:
+                break
+            if None in node:
+                found, depth = node[None], i + 1
+        if found is None:
+            return None, None
+        return found, arcs[depth:]
+
+
+class oid_registry():
+    """
+    This class maps OID prefixes to vendor decoders, each filling the columns of one output table, so a single
+    walk over several subtrees (client table, AP names, radio stats) is parsed in one pass
+    """
+
+    def __init__(self):
+        self.trie = oid_trie()
+        self.tables = {}
+
+    def register(self, prefix, table, columns, decoder):
+
+        """
+        this method registers decoder(index_arcs, value) -> tuple of `columns` for the OIDs under prefix;
+        several prefixes may fill the same table as long as they declare the same columns
+        """
+        columns = tuple(columns)
+        if self.tables.setdefault(table, columns) != columns:
+            raise Exception("table {} already registered with columns {}".format(table, self.tables[table]))
+        self.trie.insert(prefix, (table, decoder))
+
+    def parse_walk(self, lines):
+
+        """
+        this method routes every walk line to its decoder and returns {table: {column: list of values}};
+        lines with no registered prefix or that fail to decode are skipped
+        """
+        output = {table: {column: [] for column in columns} for table, columns in self.tables.items()}
+        appenders = {table: [output[table][column].append for column in columns] for table, columns in self.tables.items()}
+        for line in lines:
+            parsed = split_walk_line(line)
+            if parsed is None:
+                continue
+            entry, index = self.trie.longest_match(parsed[0])
+            if entry is None:
+                continue
+            table, decoder = entry
+            try:
+                row = decoder(index, parsed[1])
+            except (ValueError, IndexError):
+                continue
+            for append, value in zip(appenders[table], row):
+                append(value)
+        return output
+
+
+def default_registry():
+
+    """
+    This function returns a registry with the Aruba and Cisco decoders known to this project; the clients table
+    (mac_orig, ip, id) is what the collector counts and sessionizes: id is the AP name on Aruba, the AP mac on Cisco
+    """
+    registry = oid_registry()
+    registry.register(ARUBA_USER_AP_NAME, "clients", ["mac_orig", "ip", "id"], decode_client_ap)
+    registry.register(CISCO_CLIENT_AP_MAC, "clients", ["mac_orig", "ip", "id"], decode_client_ap_mac)
+    registry.register(ARUBA_AP_NAME, "ap_names", ["ap_mac", "ap_name"], decode_mac_value)
+    registry.register(CISCO_AP_NAME, "ap_names", ["ap_mac", "ap_name"], decode_mac_value)
+    registry.register(ARUBA_RADIO_CLIENTS, "radio_clients", ["ap_mac", "radio", "clients"], decode_radio_clients)
+    return registry
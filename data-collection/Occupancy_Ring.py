@@ -0,0 +1,89 @@
+import calendar
+import datetime
+import math
+import threading
+from array import array
+
+
+MISSING = -1
+
+
+class occupancy_ring():
+    """
+    This class keeps the per-AP counts of the polls of the last `hours` in memory: one fixed-size array per AP plus the
+    poll timestamps, written round-robin (poll n goes to slot n % slots). The slots are sized for the fastest polling
+    (min_interval seconds for each of `controllers`), polls older than the window are never returned and APs not
+    reported within it are dropped, so memory stays bounded however long it runs and however the intervals adapt
+    """
+
+    def __init__(self, hours=6, min_interval=60, controllers=1):
+
+        self.seconds = hours * 3600
+        self.slots = int(math.ceil(self.seconds / min_interval) + 1) * controllers
+        self.epoch = array('d', [0.0] * self.slots)
+        self.ts = [None] * self.slots                  # ts string as stored in the local db
+        self.columns = {}                              # AP id -> array('l') of counts, MISSING when not in that poll
+        self.latest = {}                               # AP id -> (value, ts, seq, epoch) of the last poll that reported it
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def append(self, ts, counts):
+
+        """
+        this method stores one poll: ts in Melrok format (%Y%m%d%H%M%S, UTC) and {AP id: count}; it returns its sequence
+        """
+        epoch = calendar.timegm(datetime.datetime.strptime(str(ts), "%Y%m%d%H%M%S").timetuple())
+        with self.lock:
+            self.sequence += 1
+            slot = self.sequence % self.slots
+            self.epoch[slot] = epoch
+            self.ts[slot] = str(ts)
+            for column in self.columns.values():
+                column[slot] = MISSING
+            for ap, value in counts.items():
+                # numpy scalars coming from the dataframes are stored as plain python values
+                ap = ap.item() if hasattr(ap, 'item') else ap
+                value = int(value)
+                column = self.columns.get(ap)
+                if column is None:
+                    column = self.columns[ap] = array('l', [MISSING] * self.slots)
+                column[slot] = value
+                self.latest[ap] = (value, str(ts), self.sequence, epoch)
+            # APs that no poll of the window reported (e.g. removed or renamed) are dropped
+            for ap in [ap for ap, latest in self.latest.items() if latest[3] < epoch - self.seconds]:
+                del self.latest[ap]
+                del self.columns[ap]
+            return self.sequence
+
+    def current(self):
+
+        """
+        this method returns (sequence, rows) with the last known (id, value, ts) of every AP
+        """
+        with self.lock:
+            rows = [(ap, value, ts) for ap, (value, ts, _, _) in sorted(self.latest.items(), key=lambda item: str(item[0]))]
+            return self.sequence, rows
+
+    def window(self, seconds=None, since=0):
+
+        """
+        this method returns (sequence, rows) with the (id, value, ts) rows of the polls newer than sequence `since`
+        and not older than `seconds` (at most the hours of the ring) before the newest poll; rows are in poll order
+        """
+        seconds = self.seconds if seconds is None else min(seconds, self.seconds)
+        with self.lock:
+            if self.sequence == 0:
+                return 0, []
+            newest = self.epoch[self.sequence % self.slots]
+            first = max(since + 1, self.sequence - self.slots + 1, 1)
+            rows = []
+            for seq in range(first, self.sequence + 1):
+                slot = seq % self.slots
+                if self.epoch[slot] < newest - seconds:
+                    continue
+                ts = self.ts[slot]
+                for ap, column in self.columns.items():
+                    value = column[slot]
+                    if value != MISSING:
+                        rows.append((ap, value, ts))
+            return self.sequence, rows
@@ -0,0 +1,136 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+
+class occupancy_server():
+    """
+    This class serves the occupancy_ring of the collector over a small asyncio HTTP/1.1 endpoint:
+        GET /current                          last known count of every AP
+        GET /recent?hours=H&since=S           rows of the polls of the last H hours (at most the hours of the ring)
+                                              newer than sequence S
+    Both accept format=json (default) or format=csv, answer with an ETag (304 on If-None-Match) and report the
+    sequence of the newest poll in the X-Sequence header, to be passed back as since= for incremental fetches.
+    """
+
+    def __init__(self, ring, project_path=".", host="127.0.0.1", port=8090):
+
+        self.ring = ring
+        self.host = host
+        self.port = port
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/occupancy_server.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+
+    def _query(self, target):
+
+        """
+        this method answers a request target with (status, headers, body)
+        """
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/current":
+                sequence, rows = self.ring.current()
+            elif url.path == "/recent":
+                hours = float(params["hours"]) if "hours" in params else None
+                since = int(params.get("since", 0))
+                sequence, rows = self.ring.window(seconds=hours * 3600 if hours is not None else None, since=since)
+            else:
+                return 404, {"Content-Type": "text/plain"}, b"not found\n"
+        except ValueError:
+            return 400, {"Content-Type": "text/plain"}, b"invalid query parameter\n"
+
+        if params.get("format") == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(["id", "value", "ts"])
+            writer.writerows(rows)
+            body, content_type = out.getvalue().encode("utf-8"), "text/csv"
+        else:
+            body = json.dumps({"sequence": sequence, "rows": [{"id": ap, "value": value, "ts": ts} for ap, value, ts in rows]}).encode("utf-8")
+            content_type = "application/json"
+        return 200, {"Content-Type": content_type, "X-Sequence": str(sequence)}, body
+
+    async def _handle(self, reader, writer):
+
+        """
+        this method serves the GET requests of one (keep-alive) connection
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3 or parts[0] not in ("GET", "HEAD"):
+                    status, extra, body = 405, {"Content-Type": "text/plain"}, b"method not allowed\n"
+                else:
+                    status, extra, body = self._query(parts[1])
+                    if status == 200:
+                        # the data only changes when a poll is appended, so the newest sequence identifies the content
+                        etag = '"{}"'.format(extra["X-Sequence"])
+                        extra["ETag"] = etag
+                        extra["Cache-Control"] = "no-cache"
+                        if headers.get("if-none-match") == etag:
+                            status, body = 304, b""
+
+                keep_alive = headers.get("connection", "").lower() != "close" and parts[-1:] == ["HTTP/1.1"]
+                reason = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+                head = ["HTTP/1.1 {} {}".format(status, reason), "Content-Length: {}".format(len(body)),
+                        "Connection: {}".format("keep-alive" if keep_alive else "close")]
+                head += ["{}: {}".format(k, v) for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if parts[:1] != ["HEAD"]:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            self.logger.error("unexpected error while serving request, error={}".format(str(e)))
+        finally:
+            writer.close()
+
+    async def serve(self):
+
+        """
+        this method runs the HTTP server until cancelled
+        """
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info("serving occupancy on {}:{}".format(self.host, self.port))
+        async with server:
+            await server.serve_forever()
+
+    def start_in_thread(self):
+
+        """
+        this method runs the server in a daemon thread next to the (blocking) collector loop
+        """
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="occupancy_server", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,142 @@
+import configparser
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import time
+from collections import deque
+
+
+def count_change_rate(previous, current):
+
+    """
+    This function returns how much the per-AP counts moved between two polls, as the sum of the absolute
+    per-AP differences relative to the previous total (0 = no change)
+    """
+    moved = sum(abs(current.get(ap, 0) - previous.get(ap, 0)) for ap in set(previous) | set(current))
+    return moved / max(sum(previous.values()), 1)
+
+
+class poll_scheduler():
+    """
+    This class keeps one poll interval per controller (SNMP config section) and adapts it to the change rate of the
+    per-AP counts: it polls faster while counts churn and backs off while they are stable, within [min, max] interval
+    """
+
+    def __init__(self, project_path = ".", config_file="config.ini"):
+
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/poll_scheduler.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+
+        """
+        read config file
+        """
+        self.config_file = config_file
+        if not os.path.exists(self.project_path+"/"+self.config_file):
+            self.logger.error("cannot find config_file={}".format(self.config_file))
+            raise Exception("config file not found")
+
+        Config = configparser.ConfigParser()
+        Config.read(self.project_path+"/"+self.config_file)
+        self.logger.info("successfully loaded config_file={}".format(self.config_file))
+
+        try:
+            self.sections = [s.strip() for s in Config.get('polling', 'sections').split(",") if s.strip()]
+            self.min_interval = Config.getfloat('polling', 'min_interval', fallback=60)
+            self.max_interval = Config.getfloat('polling', 'max_interval', fallback=900)
+            self.initial_interval = Config.getfloat('polling', 'initial_interval', fallback=self.min_interval)
+            self.churn_threshold = Config.getfloat('polling', 'churn_threshold', fallback=0.10)
+            self.stable_threshold = Config.getfloat('polling', 'stable_threshold', fallback=0.02)
+            self.speedup_factor = Config.getfloat('polling', 'speedup_factor', fallback=0.5)
+            self.backoff_factor = Config.getfloat('polling', 'backoff_factor', fallback=1.5)
+            self.history = Config.getint('polling', 'history', fallback=3)
+        except Exception as e:
+            self.logger.error("unexpected error while setting configuration from config_file={}, error={}".format(self.config_file, str(e)))
+            raise e
+
+        """
+        per controller state: current interval, next poll time, last counts and recent change rates
+        """
+        now = time.monotonic()
+        self.state = {}
+        for section in self.sections:
+            self.state[section] = {
+                "interval": self._clamp(self.initial_interval),
+                "next_poll": now,
+                "last_counts": None,
+                "rates": deque(maxlen=self.history),
+            }
+
+    def _clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def due(self, now=None):
+
+        """
+        this method returns the controllers whose next poll time has been reached
+        """
+        now = time.monotonic() if now is None else now
+        return [section for section, s in self.state.items() if s["next_poll"] <= now]
+
+    def seconds_until_next(self, now=None):
+
+        """
+        this method returns how long to sleep before the next controller is due
+        """
+        now = time.monotonic() if now is None else now
+        if not self.state:
+            return self.max_interval
+        return max(min(s["next_poll"] for s in self.state.values()) - now, 0)
+
+    def record_poll(self, section, counts, now=None):
+
+        """
+        this method records the per-AP counts ({id: value}) of a poll, adapts the interval of the controller
+        and schedules its next poll; it returns the interval in use
+        """
+        now = time.monotonic() if now is None else now
+        s = self.state[section]
+        if s["last_counts"] is not None:
+            s["rates"].append(count_change_rate(s["last_counts"], counts))
+        s["last_counts"] = counts
+
+        interval = s["interval"]
+        if s["rates"]:
+            rate = sum(s["rates"]) / len(s["rates"])
+            if rate >= self.churn_threshold:
+                interval = self._clamp(interval * self.speedup_factor)
+            elif rate <= self.stable_threshold:
+                interval = self._clamp(interval * self.backoff_factor)
+
+            if interval != s["interval"]:
+                self.logger.info("poll interval of {} changed from {:.0f}s to {:.0f}s, change rate={:.3f}".format(
+                    section, s["interval"], interval, rate))
+                s["interval"] = interval
+
+        s["next_poll"] = now + s["interval"]
+        return s["interval"]
+
+    def record_failure(self, section, now=None):
+
+        """
+        this method reschedules a controller whose poll failed at its current interval, without touching its history
+        """
+        now = time.monotonic() if now is None else now
+        s = self.state[section]
+        s["next_poll"] = now + s["interval"]
+        self.logger.warning("poll of {} failed, retrying in {:.0f}s".format(section, s["interval"]))
+        return s["interval"]
+
+
+if __name__ == '__main__':
+
+    scheduler = poll_scheduler()
@@ -0,0 +1,46 @@
+import json
+import os
+import re
+
+
+class push_checkpoint():
+    """
+    This class persists, for one remote sink, the number of the last batch committed to it and the local buffer rowid
+    (with the (ts, id) key of that row) it ended at, so an interrupted push resumes after that batch instead of sending
+    the whole local buffer again
+    """
+
+    def __init__(self, project_path=".", sink="remote_db"):
+
+        self.project_path = project_path
+        self.sink = re.sub(r"[^A-Za-z0-9_.-]+", "_", sink)
+        if not os.path.exists(self.project_path+"/"+'checkpoints'):
+            os.makedirs(self.project_path+"/"+'checkpoints')
+        self.filename = self.project_path+"/checkpoints/"+self.sink+".json"
+
+    def load(self):
+
+        """
+        this method returns (batch number, last rowid, last key) of the last committed batch, with rowid and key None
+        when nothing is pending (nothing committed yet, or the committed rows were already removed from the buffer)
+        """
+        if not os.path.exists(self.filename):
+            return 0, None, None
+        with open(self.filename) as f:
+            checkpoint = json.load(f)
+        key = checkpoint.get("last_key")
+        return checkpoint.get("batch", 0), checkpoint.get("last_rowid"), tuple(key) if key is not None else None
+
+    def save(self, batch, last_rowid=None, last_key=None):
+
+        """
+        this method atomically records the batch number, the last rowid it committed and the (ts, id) key of that row;
+        saving without a rowid clears the cursor once the committed rows are removed from the buffer
+        """
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"batch": batch, "last_rowid": last_rowid,
+                       "last_key": list(last_key) if last_key is not None else None}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.filename)
@@ -4,10 +4,12 @@ from pandas import DataFrame, Series, DatetimeIndex, to_datetime, datetime
 import numpy as np
 import configparser
 import datetime
+import time
 from collections import defaultdict
 from logging.handlers import TimedRotatingFileHandler
 from pydal import DAL, Field
 from influxdb import DataFrameClient
+from Push_Checkpoint import push_checkpoint
 from typing import Optional, Generator, Dict
 
 # Luigi, Katelyn, Jasmine, Jose
@@ -124,40 +126,86 @@ class remote_db():
         except:
             self.path = None
 
+        """
+        Optional connection reuse arguments (long-lived push service)
+        """
+        try:
+            self.health_check_interval = float(config.get('remote_db', 'health_check_interval'))
+        except:
+            self.health_check_interval = 300
+        try:
+            self.batch_size = int(config.get('remote_db', 'batch_size'))
+        except:
+            self.batch_size = 1000
+        """Optional Timescale Arguments (intervals in postgres syntax, e.g. 1 day)"""
+        try:
+            self.chunk_time_interval = config.get('remote_db', 'chunk_time_interval')
+        except:
+            self.chunk_time_interval = None
+        try:
+            self.compress_after = config.get('remote_db', 'compress_after')
+        except:
+            self.compress_after = None
+        try:
+            self.compress_segmentby = config.get('remote_db', 'compress_segmentby')
+        except:
+            self.compress_segmentby = 'ap_id'
+        try:
+            self.drop_after = config.get('remote_db', 'drop_after')
+        except:
+            self.drop_after = None
+        try:
+            self.continuous_aggregates = [
+                a.strip() for a in config.get('remote_db', 'continuous_aggregates').split(',') if a.strip()
+            ]
+        except:
+            self.continuous_aggregates = []
+
         """
         create a connection to the remote db
         """
 
         # self.db is filled by create_DB_connection()
         self.db = None
+        # the schema (tables, hypertable) is checked only by the first connection
+        self.schema_checked = False
+        self.last_used = None
         self.create_DB_connection()
 
     def create_DB_connection(self):
         """
-        this method tries to establish a db connection
+        this method tries to establish a db connection; the schema is created/checked only the first time
         """
+        check_schema = not self.schema_checked
         try:
             if self.db_type == "mysql":
                 self.db = DAL('mysql://{}:{}@{}:{}/{}?set_encoding=utf8mb4'.format(
                     self.username, self.password, self.host, self.port, self.database
-                ))
+                ), pool_size=self.pool_size or 0, migrate=check_schema)
                 self.create_table()
+                if check_schema:
+                    self.create_natural_key_index()
 
             elif self.db_type == "sqlite":
-                self.db = DAL('sqlite://{}'.format(self.filename))
+                self.db = DAL('sqlite://{}'.format(self.filename), migrate=check_schema)
                 self.create_table()
+                if check_schema:
+                    self.create_natural_key_index()
 
             elif self.db_type == "postgres":
                 self.db = DAL('postgres://{}:{}@{}:{}/{}'.format(
                     self.username, self.password, self.host, self.port, self.database
-                ))
+                ), pool_size=self.pool_size or 0, migrate=check_schema)
                 self.create_table()
+                if check_schema:
+                    self.create_natural_key_index()
 
             elif self.db_type == "timescale":
                 self.db = DAL('postgres://{}:{}@{}:{}/{}'.format(
                     self.username, self.password, self.host, self.port, self.database
-                ))
-                self.create_hypertable_timescale()
+                ), pool_size=self.pool_size or 0)
+                if check_schema:
+                    self.create_hypertable_timescale()
 
             elif self.db_type == "influx":
                 self.db = None
@@ -166,13 +214,56 @@ class remote_db():
             else:
                 raise Exception('Database type string invalid.')
 
+            self.schema_checked = True
+            self.last_used = time.monotonic()
             self.logger.info("remote db connection successfully established")
 
         except Exception as e:
             self.logger.error("could not connect to remote db")
             raise e
 
+    def check_connection(self) -> bool:
+        """
+        this method runs a cheap round trip (SELECT 1 / influx ping) and tells whether the connection is usable
+        """
+        try:
+            if self.db_type == "influx":
+                self.influx_client.ping()
+            else:
+                self.db.executesql("SELECT 1;")
+            self.last_used = time.monotonic()
+            return True
+        except Exception as e:
+            self.logger.warning("remote db health check failed, error='{}'".format(str(e)))
+            return False
+
+    def reconnect(self):
+        """
+        this method drops the current connection and opens a new one, without re-running the schema setup
+        """
+        try:
+            if self.db_type == "influx":
+                self.influx_client.close()
+            elif self.db is not None:
+                self.db.close()
+        except Exception as e:
+            self.logger.warning("could not close remote db connection, error='{}'".format(str(e)))
+        self.logger.info("reconnecting to remote db")
+        self.create_DB_connection()
+
+    def ensure_connection(self):
+        """
+        this method health checks a connection that has been idle longer than health_check_interval and
+        reconnects if it is not usable
+        """
+        if self.last_used is None or time.monotonic() - self.last_used > self.health_check_interval:
+            if not self.check_connection():
+                self.reconnect()
+
     def set_up_influx_client(self) -> DataFrameClient:
+        """
+        the client keeps one requests session, so HTTP connections are kept alive across pushes (pool_size in config)
+        """
         self.influx_client = DataFrameClient(
             host=self.host,
             port=self.port,
@@ -184,12 +275,13 @@ class remote_db():
         return self.influx_client
 
     def push_to_influx_database(
-        self, data: DataFrame, measurement: str
+        self, data: DataFrame, measurement: str, tag_columns: Optional[list] = None
     ) -> None:
         """
         Push dataframe to database.
         :param data: pandas DataFrame indexed by timestamp
         :param measurement: the name of this measurement
+        :param tag_columns: the columns written as tags, id by default
         :return:
         """
         def data_chunks(
@@ -236,20 +328,30 @@ class remote_db():
         columns[0], columns[ts_index] = columns[ts_index], columns[0]
         data = data[columns]
 
+        # points are keyed by measurement, tags (id) and timestamp, so re-sent points overwrite instead of duplicating
         for chunk in data_chunks(data, 'ts'):
             self.influx_client.write_points(
                 dataframe=chunk,
                 measurement=measurement,
                 database=self.database,
-                tag_columns=['id']
+                tag_columns=tag_columns or ['id']
             )
 
     def create_table(self):
         """
-        this method creates a SQL type of table in the remote db, if it fails, it catches the warning and logs it
+        this method creates a SQL type of table in the remote db, if it fails, it catches the warning and logs it;
+        it also creates the <table_name>_sessions and <table_name>_dwell tables the device sessions are pushed to
         """
         try:
             self.db.define_table(self.table_name, Field('AP_id'), Field('value', type='integer'), Field('time', type='datetime'))
+            self.db.define_table(
+                self.table_name+"_sessions", Field('token', length=64), Field('AP_id'),
+                Field('first_seen', type='datetime'), Field('last_seen', type='datetime'), Field('dwell', type='double')
+            )
+            self.db.define_table(
+                self.table_name+"_dwell", Field('AP_id'), Field('dwell_max', type='integer'),
+                Field('sessions', type='integer'), Field('time', type='datetime')
+            )
             self.logger.info("{} was created in remote db".format(self.table_name))
 
         except Exception as e:
@@ -267,11 +369,16 @@ class remote_db():
         """
         self.create_table_timescale()
         self.table_to_hypertable()
+        self.create_natural_key_index()
+        self.set_up_compression_timescale()
+        self.set_up_retention_timescale()
+        self.set_up_continuous_aggregates_timescale()
 
 
     def create_table_timescale(self):
         """
-        this method creates a postgres table in preparation for a hypertable in timescale
+        this method creates a postgres table in preparation for a hypertable in timescale, and the plain
+        <table_name>_sessions and <table_name>_dwell tables of the device sessions
         """
         try:
             self.db.executesql(
@@ -279,6 +386,15 @@ class remote_db():
                     self.table_name
                 )
             )
+            self.db.executesql(
+                "CREATE TABLE IF NOT EXISTS {}_sessions(token CHAR(64), AP_id CHAR(512), first_seen TIMESTAMP, "
+                "last_seen TIMESTAMP, dwell DOUBLE PRECISION);".format(self.table_name)
+            )
+            self.db.executesql(
+                "CREATE TABLE IF NOT EXISTS {}_dwell(time TIMESTAMP, AP_id CHAR(512), dwell_max INT, sessions INT);".format(
+                    self.table_name
+                )
+            )
             self.db.commit()
             self.logger.info("{} created in remote db".format(self.table_name))
 
@@ -293,9 +409,20 @@ class remote_db():
         this method tries to turn the table into a hypertable, and it if it fails, it will catch the warning and rollback the commit
         """
         try:
-            self.db.executesql(
-                "SELECT create_hypertable('{}', 'time');".format(self.table_name)
-            )
+            if self.chunk_time_interval:
+                self.db.executesql(
+                    "SELECT create_hypertable('{}', 'time', chunk_time_interval => INTERVAL '{}', if_not_exists => TRUE);".format(
+                        self.table_name, self.chunk_time_interval
+                    )
+                )
+                # an existing hypertable keeps its old interval otherwise; only chunks created from now on are affected
+                self.db.executesql(
+                    "SELECT set_chunk_time_interval('{}', INTERVAL '{}');".format(self.table_name, self.chunk_time_interval)
+                )
+            else:
+                self.db.executesql(
+                    "SELECT create_hypertable('{}', 'time', if_not_exists => TRUE);".format(self.table_name)
+                )
             self.db.commit()
             self.logger.info(
                 "successfully created hypertable from {}".format(self.table_name)
@@ -307,6 +434,241 @@ class remote_db():
                 self.table_name, str(e))
             )
 
+    def _execute_timescale_setup(self, queries, description):
+        """
+        this method runs the queries of one idempotent setup step in a transaction; if they fail, it rolls back and
+        logs a warning so the remaining steps still run
+        """
+        try:
+            for query in queries:
+                self.db.executesql(query)
+            self.db.commit()
+            self.logger.info("{} set up for {}".format(description, self.table_name))
+
+        except Exception as e:
+            self.db.rollback()
+            self.logger.warning("tried to set up {} for {}, returned message='{}'".format(
+                description, self.table_name, str(e))
+            )
+
+    def _timescale_policy_matches(self, proc_name, key, interval):
+        """
+        this method compares the interval of the table's policy job (policy_compression / policy_retention) with the
+        configured one; it returns None when there is no such policy yet
+        """
+        rows = self.db.executesql(
+            "SELECT (config->>'{}')::interval = INTERVAL '{}' FROM timescaledb_information.jobs "
+            "WHERE proc_name = '{}' AND hypertable_name = '{}';".format(key, interval, proc_name, self.table_name)
+        )
+        return bool(rows[0][0]) if rows else None
+
+    def _set_up_policy_timescale(self, proc_name, key, interval, add_query, remove_query, description, queries=()):
+        """
+        this method adds the policy when it is missing and replaces it when config changed its interval; queries are
+        run before it in the same step
+        """
+        try:
+            matches = self._timescale_policy_matches(proc_name, key, interval)
+        except Exception as e:
+            self.db.rollback()
+            self.logger.warning("could not read the {} of {}, returned message='{}'".format(description, self.table_name, str(e)))
+            return
+        queries = list(queries)
+        if matches is False:
+            self.logger.info("{} of {} changed to {} = {}, replacing it".format(description, self.table_name, key, interval))
+            queries.append(remove_query)
+        if matches is not True:
+            queries.append(add_query)
+        if queries:
+            self._execute_timescale_setup(queries, description)
+        else:
+            self.logger.info("{} of {} already up to date".format(description, self.table_name))
+
+    def set_up_compression_timescale(self):
+        """
+        this method enables native compression segmented by AP id and compresses chunks older than compress_after;
+        once compression is enabled its settings are left alone (they cannot change while chunks are compressed)
+        """
+        if not self.compress_after:
+            return
+        try:
+            rows = self.db.executesql(
+                "SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = '{}';".format(
+                    self.table_name)
+            )
+            compression_enabled = bool(rows and rows[0][0])
+        except Exception as e:
+            self.db.rollback()
+            self.logger.warning("could not read the compression settings of {}, returned message='{}'".format(
+                self.table_name, str(e))
+            )
+            return
+        queries = [] if compression_enabled else [
+            "ALTER TABLE {} SET (timescaledb.compress, timescaledb.compress_segmentby = '{}', "
+            "timescaledb.compress_orderby = 'time DESC');".format(self.table_name, self.compress_segmentby),
+        ]
+        self._set_up_policy_timescale(
+            'policy_compression', 'compress_after', self.compress_after,
+            "SELECT add_compression_policy('{}', INTERVAL '{}', if_not_exists => TRUE);".format(
+                self.table_name, self.compress_after),
+            "SELECT remove_compression_policy('{}', if_exists => TRUE);".format(self.table_name),
+            "compression policy", queries)
+
+    def set_up_retention_timescale(self):
+        """
+        this method drops chunks older than drop_after
+        """
+        if not self.drop_after:
+            return
+        self._set_up_policy_timescale(
+            'policy_retention', 'drop_after', self.drop_after,
+            "SELECT add_retention_policy('{}', INTERVAL '{}', if_not_exists => TRUE);".format(
+                self.table_name, self.drop_after),
+            "SELECT remove_retention_policy('{}', if_exists => TRUE);".format(self.table_name),
+            "retention policy")
+
+    def set_up_continuous_aggregates_timescale(self):
+        """
+        this method creates the continuous aggregates (<table>_hourly, <table>_daily) of value per AP, and the policies
+        that keep them refreshed
+        """
+        # bucket, refresh window start and end offsets, refresh schedule
+        aggregates = {
+            'hourly': ('1 hour', '3 hours', '1 hour', '1 hour'),
+            'daily': ('1 day', '3 days', '1 day', '1 day'),
+        }
+        for name in self.continuous_aggregates:
+            if name not in aggregates:
+                self.logger.warning("unknown continuous aggregate {}, use hourly or daily".format(name))
+                continue
+            bucket, start_offset, end_offset, schedule = aggregates[name]
+            view = "{}_{}".format(self.table_name, name)
+            self._execute_timescale_setup([
+                "CREATE MATERIALIZED VIEW IF NOT EXISTS {} WITH (timescaledb.continuous) AS "
+                "SELECT time_bucket(INTERVAL '{}', time) AS bucket, AP_id, "
+                "avg(value) AS avg_value, min(value) AS min_value, max(value) AS max_value, count(*) AS polls "
+                "FROM {} GROUP BY bucket, AP_id WITH NO DATA;".format(view, bucket, self.table_name),
+                "SELECT add_continuous_aggregate_policy('{}', start_offset => INTERVAL '{}', end_offset => INTERVAL '{}', "
+                "schedule_interval => INTERVAL '{}', if_not_exists => TRUE);".format(view, start_offset, end_offset, schedule),
+            ], "continuous aggregate {}".format(view))
+
+    def quoted_names(self, table_name=None, columns=("AP_id", "value", "time")):
+        """
+        this method returns the table (table_name by default) and its columns (AP_id, value and time by default) as
+        they must appear in raw SQL: pyDAL quotes the identifiers of the tables it defines (e.g. a case-sensitive
+        "AP_id" on postgres), while the timescale tables are created by raw SQL with unquoted names
+        """
+        table_name = table_name or self.table_name
+        if self.db is None or table_name not in self.db.tables:
+            return (table_name,) + tuple(columns)
+        table = self.db[table_name]
+        return (table._rname,) + tuple(table[column]._rname for column in columns)
+
+    def create_natural_key_index(self):
+        """
+        this method creates the unique indexes that make repeated inserts of the same rows no-ops: (AP_id, time) on the
+        counts, (token, first_seen) on the sessions and (AP_id, dwell_max, time) on the dwell histograms
+        """
+        if_not_exists = "" if self.db_type == "mysql" else "IF NOT EXISTS "
+        indexes = [
+            (self.table_name, ("AP_id", "time"), "ap_time"),
+            (self.table_name+"_sessions", ("token", "first_seen"), "token_first_seen"),
+            (self.table_name+"_dwell", ("AP_id", "dwell_max", "time"), "ap_bin_time"),
+        ]
+        for table_name, columns, suffix in indexes:
+            names = self.quoted_names(table_name, columns)
+            try:
+                self.db.executesql("CREATE UNIQUE INDEX {}{}_{} ON {} ({});".format(
+                    if_not_exists, table_name, suffix, names[0], ", ".join(names[1:]))
+                )
+                self.db.commit()
+                self.logger.info("natural key index on {} ({}) in place".format(table_name, ", ".join(columns)))
+
+            except Exception as e:
+                self.db.rollback()
+                self.logger.warning(
+                    "could not create natural key index on {}, it may already exist or the table holds duplicates, "
+                    "returned message='{}'".format(table_name, str(e))
+                )
+
+    def sink_name(self) -> str:
+        """
+        this method names the remote sink, used to keep one push checkpoint per sink
+        """
+        return "{}_{}_{}_{}".format(self.db_type, self.host or self.filename, self.database, self.table_name)
+
+    def push_backlog(self, engine, batch_size: Optional[int] = None) -> int:
+        """
+        this method pushes the local buffer of engine (a local_db) in numbered batches in insertion (rowid) order and
+        checkpoints each committed batch, so a push interrupted by a failure resumes after the last committed batch;
+        the rows up to the checkpoint are then removed from the local buffer. The rowid only grows while rows are
+        pending, unlike (ts, id) which a second controller or a clock step can write below the last key sent;
+        (AP_id, time) remains the remote dedup key.
+        Archive segments compacted out of the buffer by buffer_retention are drained first; the inserts are
+        idempotent, so a segment interrupted halfway is simply sent again. The device sessions and dwell histograms
+        buffered by run_collector.py (<table>_sessions, <table>_dwell) are drained the same way, each with its own
+        checkpoint.
+        :return: the number of the last committed batch of the counts
+        """
+        batch_size = batch_size or self.batch_size
+        for segment in engine.archive_segments():
+            data = engine.read_archive_segment(segment)
+            for start in range(0, len(data), batch_size):
+                self.push_to_remote_db(data.iloc[start:start+batch_size].copy())
+            engine.delete_archive_segment(segment)
+            self.logger.info("archive segment {} of {} rows committed to remote db".format(segment, len(data)))
+
+        batch = self.push_buffer_table(engine, batch_size, engine.table, ("ts", "id"), self.push_to_remote_db, self.sink_name())
+        for suffix, key, push in (
+            ("_sessions", ("first_seen", "token"), self.push_sessions_to_remote_db),
+            ("_dwell", ("ts", "id"), self.push_dwell_to_remote_db),
+        ):
+            if engine.has_table(engine.table+suffix):
+                self.push_buffer_table(engine, batch_size, engine.table+suffix, key, push, self.sink_name()+suffix)
+        return batch
+
+    def push_buffer_table(self, engine, batch_size: int, table: str, key: tuple, push, sink: str) -> int:
+        """
+        this method pushes one table of the local buffer with push in rowid order, checkpointed under sink; key names
+        the two columns checked against the checkpointed rowid before resuming from it and before deleting up to it
+        :return: the number of the last committed batch
+        """
+        checkpoint = push_checkpoint(self.project_path, sink)
+        batch, last_rowid, last_key = checkpoint.load()
+        if last_rowid is not None:
+            # sqlite reuses the rowids of an emptied table, so the checkpoint only holds while its row is still there
+            if engine.read_key_at(last_rowid, table=table, key=key) != last_key:
+                self.logger.warning("checkpointed row {} {} is gone from {}, pushing the whole table again".format(
+                    last_rowid, last_key, table))
+                last_rowid = None
+            else:
+                self.logger.info("resuming push of {} after batch {}, rowid={}".format(table, batch, last_rowid))
+
+        while True:
+            data = engine.read_local_DB_batch(after=last_rowid, batch_size=batch_size, table=table)
+            if data.empty:
+                break
+            rowid = int(data.pop('_rowid').iloc[-1])
+            first, second = data[key[0]].iloc[-1], data[key[1]].iloc[-1]
+            # numpy scalars are neither json nor sqlite friendly
+            row_key = (str(first), second.item() if hasattr(second, 'item') else second)
+            push(data)
+            batch += 1
+            checkpoint.save(batch, rowid, row_key)
+            last_rowid, last_key = rowid, row_key
+            self.logger.info("batch {} of {} rows of {} committed to remote db".format(batch, len(data), table))
+
+        if last_rowid is not None:
+            if engine.read_key_at(last_rowid, table=table, key=key) != last_key:
+                # the rowids changed under the push (e.g. a VACUUM renumbered them): deleting up to last_rowid could
+                # remove rows that were never sent, so nothing is deleted and the next push sends the table again
+                self.logger.warning("row {} is no longer {} in {}, keeping it".format(last_rowid, last_key, table))
+                checkpoint.save(batch)
+            elif engine.delete_data_up_to(last_rowid, table=table):
+                # nothing is pending anymore; rows saved from now on may reuse the rowids just deleted
+                checkpoint.save(batch)
+        return batch
+
     def push_to_remote_db(self, data: DataFrame):
         try:
             if self.db_type == "mysql"\
@@ -325,31 +687,120 @@ class remote_db():
             else:
                 raise Exception('Database type string invalid.')
 
+            self.last_used = time.monotonic()
             self.logger.info("push to remote successful")
 
         except Exception as e:
             self.logger.error("push failed")
             raise e
 
+    @staticmethod
+    def sql_time(ts: str) -> str:
+        """
+        this method turns a buffer timestamp (YYYYmmddHHMMSS) into a SQL datetime literal
+        """
+        return ts[:4] + '-' + ts[4:6] + '-' + ts[6:8] + ' ' + ts[8:10] + ':' + ts[10:12] + ':' + ts[12:14]
+
+    def insert_ignore(self, table_name, columns, rows, rows_per_statement=300):
+        """
+        this method inserts rows (tuples in the order of columns) with multi-row statements that skip the rows whose
+        natural key already exists, so retried batches never duplicate data; the caller commits
+        """
+        placeholder = "?" if self.db_type == "sqlite" else "%s"
+        if self.db_type == "sqlite":
+            statement = "INSERT OR IGNORE INTO {} ({}) VALUES {{}};"
+        elif self.db_type == "mysql":
+            statement = "INSERT IGNORE INTO {} ({}) VALUES {{}};"
+        else:
+            statement = "INSERT INTO {} ({}) VALUES {{}} ON CONFLICT DO NOTHING;"
+        names = self.quoted_names(table_name, columns)
+        statement = statement.format(names[0], ", ".join(names[1:]))
+
+        row_placeholders = "({})".format(", ".join([placeholder] * len(columns)))
+        for start in range(0, len(rows), rows_per_statement):
+            chunk = rows[start:start+rows_per_statement]
+            values = ", ".join([row_placeholders] * len(chunk))
+            self.db.executesql(
+                statement.format(values),
+                placeholders=[field for row in chunk for field in row]
+            )
+
+    def insert_ignore_rows(self, data, rows_per_statement=300):
+        """
+        this method inserts the rows of a pandas dataframe with multi-row statements that skip the rows whose
+        (AP_id, time) already exists, so retried batches never duplicate data; the caller commits
+        """
+        rows = [
+            (str(ap_id), int(value), self.sql_time(ts))
+            for ap_id, value, ts in zip(data['id'], data['value'], data['ts'].astype(str))
+        ]
+        self.insert_ignore(self.table_name, ("AP_id", "value", "time"), rows, rows_per_statement)
+
+    def push_rows_to_remote_db(self, table_name, columns, rows):
+        """
+        this method inserts and commits rows into one of the SQL tables of the remote db
+        """
+        try:
+            self.insert_ignore(table_name, columns, rows)
+            self.db.commit()
+            self.last_used = time.monotonic()
+            self.logger.info("data successfully pushed to remote db table {}".format(table_name))
+
+        except Exception as e:
+            self.db.rollback()
+            self.logger.error("pushing to remote database table {} failed".format(table_name))
+            raise e
+
+    def push_sessions_to_remote_db(self, data: DataFrame):
+        """
+        this method pushes closed device sessions (token, id, first_seen, last_seen, dwell) to <table_name>_sessions
+        """
+        if self.db_type == "influx":
+            self.push_to_influx_database(
+                data=data.rename(columns={'first_seen': 'ts'}),
+                measurement=self.table_name+"_sessions",
+                tag_columns=['id', 'token']
+            )
+            self.last_used = time.monotonic()
+            return
+        rows = [
+            (str(token), str(ap_id), self.sql_time(first_seen), self.sql_time(last_seen), float(dwell))
+            for token, ap_id, first_seen, last_seen, dwell in zip(
+                data['token'], data['id'], data['first_seen'].astype(str), data['last_seen'].astype(str), data['dwell'])
+        ]
+        self.push_rows_to_remote_db(self.table_name+"_sessions", ("token", "AP_id", "first_seen", "last_seen", "dwell"), rows)
+
+    def push_dwell_to_remote_db(self, data: DataFrame):
+        """
+        this method pushes the per-AP dwell histograms (id, dwell_max, sessions, ts) to <table_name>_dwell; the
+        open-ended bin (no dwell_max) is written with dwell_max 0, so that it is covered by the unique index
+        """
+        data['dwell_max'] = data['dwell_max'].fillna(0).astype(int)
+        if self.db_type == "influx":
+            self.push_to_influx_database(
+                data=data,
+                measurement=self.table_name+"_dwell",
+                tag_columns=['id', 'dwell_max']
+            )
+            self.last_used = time.monotonic()
+            return
+        rows = [
+            (str(ap_id), int(dwell_max), int(sessions), self.sql_time(ts))
+            for ap_id, dwell_max, sessions, ts in zip(data['id'], data['dwell_max'], data['sessions'], data['ts'].astype(str))
+        ]
+        self.push_rows_to_remote_db(self.table_name+"_dwell", ("AP_id", "dwell_max", "sessions", "time"), rows)
+
     def push_to_remote_dal(self, data):
         """
         this method pushes a pandas dataframe to the remote db
         """
         try:
-            for i, row in data.iterrows():
-                self.db[self.table_name].insert(
-                    AP_id=row['id'],
-                    value=row['value'],
-                    time=(
-                        row['ts'][:4] + '-' + row['ts'][4:6] + '-' + row['ts'][6:8]
-                        + ' '
-                        + row['ts'][8:10] + ':' + row['ts'][10:12] + ':' + row['ts'][12:14]
-                    )
-                )
+            self.insert_ignore_rows(data)
             self.db.commit()
             self.logger.info("data successfully pushed to remote db")
 
         except Exception as e:
+            self.db.rollback()
             self.logger.error("pushing to remote database failed")
             raise e
 
@@ -360,18 +811,12 @@ class remote_db():
         """
 
         try:
-            query = "INSERT INTO {} VALUES".format(self.table_name)
-
-            for i, row in data.iterrows():
-                time = (row['ts'][:4] + '-' + row['ts'][4:6] + '-' + row['ts'][6:8] + ' ' + row['ts'][8:10] + ':' + row['ts'][10:12] + ':' + row['ts'][12:14])
-                query = query + "('{}', '{}', '{}'),".format(time, row['id'], row['value'])
-
-            query = query[:-1] + ';'
-            self.db.executesql(query)
+            self.insert_ignore_rows(data)
             self.db.commit()
             self.logger.info("data successfully pushed to remote db")
 
         except Exception as e:
+            self.db.rollback()
             self.logger.error("pushing to remote database failed")
             raise e
 
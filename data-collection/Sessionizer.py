@@ -0,0 +1,116 @@
+from array import array
+from bisect import bisect_left
+
+
+class device_sessionizer():
+    """
+    This class turns successive polls of (anonymized MAC token, AP id) into device sessions. The state of each active
+    device (token, current AP, first seen, last seen) lives in array-backed slots found through a token -> slot hash
+    table; slots of closed sessions are reused, so memory follows the number of active devices. A session closes when
+    its device moves to another AP or has not been seen for idle_timeout seconds.
+    """
+
+    def __init__(self, idle_timeout=900, dwell_bins=(300, 900, 1800, 3600, 7200, 14400)):
+
+        self.idle_timeout = idle_timeout
+        self.dwell_bins = sorted(dwell_bins)      # upper bounds in seconds; one more bin collects longer sessions
+        self.slot_of = {}                         # token -> slot
+        self.tokens = []
+        self.ap = array('l')                      # interned AP index, -1 for a free slot
+        self.first_seen = array('d')
+        self.last_seen = array('d')
+        self.free = []
+        self.ap_index = {}                        # AP id -> interned index
+        self.ap_ids = []
+        self.histograms = {}                      # AP id -> sessions per dwell bin since the last flush
+
+    def _intern(self, ap_id):
+        index = self.ap_index.get(ap_id)
+        if index is None:
+            index = self.ap_index[ap_id] = len(self.ap_ids)
+            self.ap_ids.append(ap_id)
+        return index
+
+    def _open(self, token, ap, seen):
+        if self.free:
+            slot = self.free.pop()
+            self.tokens[slot] = token
+            self.ap[slot] = ap
+            self.first_seen[slot] = seen
+            self.last_seen[slot] = seen
+        else:
+            slot = len(self.tokens)
+            self.tokens.append(token)
+            self.ap.append(ap)
+            self.first_seen.append(seen)
+            self.last_seen.append(seen)
+        self.slot_of[token] = slot
+
+    def _close(self, slot, closed):
+        ap_id = self.ap_ids[self.ap[slot]]
+        dwell = self.last_seen[slot] - self.first_seen[slot]
+        closed.append((self.tokens[slot], ap_id, self.first_seen[slot], self.last_seen[slot], dwell))
+        histogram = self.histograms.get(ap_id)
+        if histogram is None:
+            histogram = self.histograms[ap_id] = [0] * (len(self.dwell_bins) + 1)
+        histogram[bisect_left(self.dwell_bins, dwell)] += 1
+        del self.slot_of[self.tokens[slot]]
+        self.tokens[slot] = None
+        self.ap[slot] = -1
+        self.free.append(slot)
+
+    def update(self, poll_time, clients):
+
+        """
+        this method applies one poll: poll_time in epoch seconds and an iterable of (token, AP id);
+        it returns the sessions closed by this poll as (token, AP id, first seen, last seen, dwell seconds)
+        """
+        return self.observe(poll_time, clients) + self.expire(poll_time)
+
+    def observe(self, poll_time, clients):
+
+        """
+        this method applies part of a poll (e.g. one chunk of the walk); call expire once the whole poll is observed.
+        It returns the sessions closed by roaming devices
+        """
+        closed = []
+        for token, ap_id in clients:
+            ap = self._intern(ap_id)
+            slot = self.slot_of.get(token)
+            if slot is not None and self.ap[slot] != ap:
+                # the device roamed: its session on the previous AP ends at its last sighting there
+                self._close(slot, closed)
+                slot = None
+            if slot is None:
+                self._open(token, ap, poll_time)
+            else:
+                self.last_seen[slot] = poll_time
+        return closed
+
+    def expire(self, poll_time):
+
+        """
+        this method closes the sessions of the devices not seen for idle_timeout seconds and returns them
+        """
+        closed = []
+        expired = poll_time - self.idle_timeout
+        for slot in [s for s in self.slot_of.values() if self.last_seen[s] < expired]:
+            self._close(slot, closed)
+        return closed
+
+    def active_devices(self):
+        return len(self.slot_of)
+
+    def flush_histograms(self):
+
+        """
+        this method returns and resets the dwell histograms as (AP id, bin upper bound in seconds or None, sessions)
+        """
+        bounds = self.dwell_bins + [None]
+        rows = [
+            (ap_id, bound, count)
+            for ap_id, histogram in sorted(self.histograms.items(), key=lambda item: str(item[0]))
+            for bound, count in zip(bounds, histogram) if count
+        ]
+        self.histograms = {}
+        return rows
@@ -3,11 +3,16 @@ import configparser
 import subprocess
 import pandas as pd
 import hashlib
+import re
+import itertools
 import datetime
 import os
 import logging
+import tempfile
 from io import StringIO
 from logging.handlers import TimedRotatingFileHandler
+from WiFi_Gatherer_Lite import wifi_gatherer_lite, connection_count_rows
+from OID_Registry import default_registry, ARUBA_USER_AP_NAME
 
 # @author : Marco Pritoni <mpritoni@lbl.gov>
 # @author : Anand Prakash <akprakash@lbl.gov>
@@ -60,6 +65,13 @@ class wifi_gatherer():
             self.logger.error("unexpected error while setting configuration from config_file={}, section={}, error={}".format(self.config_file, self.snmp_section, str(e)))
             raise e
 
+        """
+        line based reader/counter shared by the parallel and the multi-table parsers (parse_processes in config)
+        """
+        self.lite = wifi_gatherer_lite(project_path=self.project_path, config_file=self.config_file, section=self.snmp_section)
+        self.parse_processes = self.lite.parse_processes
+        self.walk_tables = self.lite.walk_tables
+
         # self.parse_script_arg()  #to get data from python call of the .py file - currently not used
 
     def parse_script_arg(self):
@@ -130,19 +142,65 @@ class wifi_gatherer():
         This method gets the wi-fi data from file or snmp query calling the corresponding methods
         """
 
-        if self.input_from_file==True:
+        if str(self.input_from_file).lower()=="true":
             data = self._get_data_from_file() # use sample file to test
         else:
             data = self._get_data_SMNP() # run real query
+        return data
+
+    def iter_wifi_data(self, chunksize=100000):
+
+        """
+        This method yields the wi-fi data from file or snmp query as dataframes of at most chunksize rows; the snmpwalk
+        output is parsed straight from the pipe instead of being copied into memory first (streaming mode)
+        """
+        names = ["oid_mac_ip", "id"]
+        if str(self.input_from_file).lower()=="true":
+            try:
+                for chunk in pd.read_csv(self.project_path+"/"+self.input_file_name, sep="\s+", header=None, names=names, chunksize=chunksize):
+                    yield chunk
+                self.logger.info("successfully streamed dataframe from csv file={}".format(self.input_file_name))
+            except Exception as e:
+                self.logger.error("unexpected error while reading from csv {}, error={}".format(self.input_file_name, str(e)))
+                raise e
+
+        elif self.source=="controller":
+            cmd = ['snmpwalk','-v','2c','-c',self.community,'-Onaq',self.switchname,self.oid]
+            with tempfile.TemporaryFile() as err:
+                try:
+                    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+                except Exception as e:
+                    self.logger.error("unexpected error when running snmpwalk command, error={}".format(str(e)))
+                    raise e
+                try:
+                    for chunk in pd.read_csv(p.stdout, sep="\s+", header=None, names=names, chunksize=chunksize):
+                        yield chunk
+                except pd.errors.EmptyDataError:
+                    pass
+                p.wait()
+                if p.returncode != 0:
+                    err.seek(0)
+                    message = err.read()
+                    self.logger.error("snmpwalk exited with status %r: %r"% (p.returncode, message))
+                    raise Exception('snmpwalk exited with status %r: %r' % (p.returncode, message))
+            self.logger.info("successfully streamed dataframe from snmp output")
+
+        else:
+            self.logger.error("currently non implemented AP - SNMP query")
 
     def parse_mac_address(self, data, regex=None):
 
         """
         This method parse mac address from long strings
+        By default the mac is the 6 arcs following the client table OID of the section (the Aruba one when oid is not
+        numeric), optionally followed by the 4 arcs of the client ip (Aruba); Cisco indexes hold the mac only
         """
         try:
             if not regex:
-                regex = r"(?:.1.3.6.1.4.1.14823.2.2.1.4.1.2.1.10)(?:\.)(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(?:\.)(?:\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})"
+                oid = self.oid.strip().strip(".")
+                if not re.fullmatch(r"[\d.]+", oid):
+                    oid = ARUBA_USER_AP_NAME
+                regex = r"(?:\.?{})\.(\d{{1,3}}(?:\.\d{{1,3}}){{5}})(?:\.\d{{1,3}}\.\d{{1,3}}\.\d{{1,3}}\.\d{{1,3}})?$".format(re.escape(oid))
 
             mac_original = data["oid_mac_ip"].str.extract(regex, expand=True)
             mac_original.columns = ["mac_orig"]
@@ -153,6 +211,46 @@ class wifi_gatherer():
             raise e
         return data
 
+    def parse_walk_tables(self, lines=None, registry=None):
+
+        """
+        This method parses a walk covering several subtrees in one pass, dispatching each line by OID prefix to the
+        vendor decoders of the registry (OID_Registry.default_registry by default); it returns a dataframe per table.
+        With walk_tables = True in config the collector counts and sessionizes the clients table instead of counting
+        every line of the walk
+        """
+        try:
+            if lines is None:
+                lines = self.lite.get_wifi_data()
+            if registry is None:
+                registry = default_registry()
+            tables = {table: pd.DataFrame(columns) for table, columns in registry.parse_walk(lines).items()}
+            if "clients" in tables:
+                # integer AP ids as read_csv infers them on the line-counting path
+                try:
+                    tables["clients"]["id"] = pd.to_numeric(tables["clients"]["id"])
+                except (ValueError, TypeError):
+                    pass
+            self.logger.info("successfully parsed walk tables {}".format(", ".join("{}={}".format(t, len(df)) for t, df in tables.items())))
+        except Exception as e:
+            self.logger.error("unexpected error while parsing walk tables, error={}".format(str(e)))
+            raise e
+        return tables
+
+    def iter_walk_tables(self, chunksize=100000, registry=None):
+
+        """
+        This method yields the tables of parse_walk_tables for successive chunks of at most chunksize walk lines
+        (streaming mode)
+        """
+        lines = iter(self.lite.get_wifi_data())
+        registry = registry or default_registry()
+        while True:
+            chunk = list(itertools.islice(lines, chunksize))
+            if not chunk:
+                break
+            yield self.parse_walk_tables(chunk, registry)
+
     def anonymize_single_MAC_address(self, key_string, salt="1Ha7"):
 
         """
@@ -160,8 +258,8 @@ class wifi_gatherer():
 
         """
         try:
-            hashed = hashlib.md5( salt + key_string ).hexdigest()
-            self.logger.info("successfully anonymized the data")
+            # called once per client: anonymize_MAC_address_df logs once per dataframe instead
+            hashed = hashlib.md5( (salt + key_string).encode('utf-8') ).hexdigest()
         except Exception as e:
             self.logger.error("expected error while anonymized the data")
             raise e
@@ -178,7 +276,7 @@ class wifi_gatherer():
             mac_hashed["mac_hashed"] = data["mac_orig"].apply(self.anonymize_single_MAC_address, salt=salt)
             data = data.join(mac_hashed)
             data = data.drop("mac_orig", axis=1)
-            self.logger.info("successfully parsed mac address dataframe")
+            self.logger.info("successfully anonymized {} mac addresses".format(len(mac_hashed)))
         except Exception as e:
             self.logger.error("unexpected error while parsing mac address dataframe, error={}".format(str(e)))
             raise e
@@ -224,6 +322,47 @@ class wifi_gatherer():
 
         return data
 
+    def merge_connection_counts(self, partial_counts, include_time=True, formatOpt="Melrok"):
+
+        """
+        This method merges the per chunk results of parse_connection_count_per_AP(chunk, include_time=False) into the
+        dataframe parse_connection_count_per_AP returns for the whole walk
+        """
+        try:
+            partial_counts = [p for p in partial_counts if not p.empty]
+            if not partial_counts:
+                self.logger.warning("data to obtain count from is None, check this")
+                return pd.DataFrame()
+            data = pd.concat(partial_counts).groupby(level=0).sum()
+            if include_time:
+                data["ts"] = self.get_current_time_utc(formatOpt)
+                data = data.reset_index()
+            self.logger.info("successfully merged connected devices counts of {} chunks".format(len(partial_counts)))
+        except Exception as e:
+            self.logger.error("unexpected error while merging counts error={}".format(str(e)))
+            raise e
+        return data
+
+    def parse_connection_count_per_AP_parallel(self, processes=None, include_time=True, formatOpt="Melrok"):
+
+        """
+        This method reads and counts the connected devices to each AP in a pool of processes (see parse_processes in
+        config) and returns the same dataframe as _get_data_from_file/_get_data_SMNP + parse_connection_count_per_AP
+        """
+        try:
+            counts = self.lite.count_connections_per_AP_parallel(processes)
+            data = pd.DataFrame(connection_count_rows(counts), columns=["id", "value"])
+            if include_time:
+                data["ts"] = self.get_current_time_utc(formatOpt)
+            else:
+                data = data.set_index("id")
+            self.logger.info("successfully counted connected devices")
+        except Exception as e:
+            self.logger.error("unexpected error while counting devices error={}".format(str(e)))
+            raise e
+
+        return data
+
 if __name__ == '__main__':
 
     w = wifi_gatherer()
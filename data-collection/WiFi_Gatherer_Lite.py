@@ -0,0 +1,360 @@
+import configparser
+import subprocess
+import datetime
+import os
+import logging
+import mmap
+import tempfile
+from collections import Counter
+from multiprocessing import get_all_start_methods, get_context
+from logging.handlers import TimedRotatingFileHandler
+
+# Standard library only: this module must stay importable on edge devices without pandas.
+
+
+def parse_walk_line(line):
+
+    """
+    This function splits one line of snmpwalk output (-Onaq) into (oid_mac_ip, id)
+    It returns None when the line carries no AP id, i.e. the rows pandas would read as NaN
+    """
+    parts = line.split(None, 1)
+    if len(parts) < 2:
+        return None
+    value = parts[1].strip()
+    if value[:1] == '"':
+        end = value.find('"', 1)
+        value = value[1:end] if end != -1 else value[1:]
+    else:
+        value = value.split(None, 1)[0]
+    if not value:
+        return None
+    return parts[0], value
+
+
+def count_connections_per_AP(lines, counts=None):
+
+    """
+    This function counts the connected devices for each AP id from an iterable of walk lines
+    The lines without an AP id are counted under None: they change the id dtype pandas infers (see connection_count_rows)
+    """
+    if counts is None:
+        counts = Counter()
+    for line in lines:
+        parsed = parse_walk_line(line)
+        counts[parsed[1] if parsed is not None else None] += 1
+    return counts
+
+
+def connection_count_rows(counts, ts=None):
+
+    """
+    This function turns AP counts into rows sorted by id, as groupby(["id"]).count() does
+    AP ids are converted to int when all of them are integers (so 007 and 7 are one AP), or to float when some lines
+    had no AP id (pandas reads those as NaN, which makes the column float and is dropped by groupby), matching the
+    dtype pandas would infer
+    """
+    keyed = [(ap, value) for ap, value in counts.items() if ap is not None]
+    try:
+        convert = float if counts.get(None) else int
+        merged = Counter()
+        for ap, value in keyed:
+            merged[convert(int(ap))] += value
+        keyed = list(merged.items())
+    except ValueError:
+        pass
+    keyed.sort()
+    if ts is None:
+        return keyed
+    return [(ap, value, ts) for ap, value in keyed]
+
+
+def line_aligned_chunks(path, chunks):
+
+    """
+    This function splits a walk file into at most `chunks` (start, end) byte ranges that begin and end on line boundaries
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, chunks):
+            newline = mm.find(b"\n", max(size * i // chunks, bounds[-1]))
+            if newline == -1:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        if bounds[-1] < size:
+            bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _count_chunk(path, start, end):
+
+    """
+    This function is run by the pool workers: it maps the file and counts the connections in bytes [start, end)
+    Only the path and the offsets are sent to the worker and only the (small) per-AP counts come back
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return count_connections_per_AP(mm[start:end].decode("utf-8").splitlines())
+
+
+def count_connections_parallel(path, processes=None):
+
+    """
+    This function counts the connected devices per AP id of a walk file using a process pool,
+    merging the partial per-AP counts of each line-aligned chunk
+    """
+    processes = processes or os.cpu_count() or 1
+    ranges = line_aligned_chunks(path, processes)
+    counts = Counter()
+    if len(ranges) <= 1:
+        for start, end in ranges:
+            counts.update(_count_chunk(path, start, end))
+        return counts
+    # fork where available: spawn/forkserver workers would re-import the (unguarded) entry point scripts
+    context = get_context("fork" if "fork" in get_all_start_methods() else None)
+    with context.Pool(min(processes, len(ranges))) as pool:
+        for partial in pool.starmap(_count_chunk, [(path, start, end) for start, end in ranges]):
+            counts.update(partial)
+    return counts
+
+
+class wifi_gatherer_lite():
+    """
+    This class gets the wifi data from the controller/file and outputs (id, value, ts) rows with AP connection counts,
+    using only the standard library. It produces the same rows as wifi_gatherer.parse_connection_count_per_AP
+    """
+
+    def __init__(self, project_path = ".", config_file="config.ini", section="SNMP_config_aruba"):
+
+        self.project_path = project_path
+        """
+        initialize logging
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+        if not os.path.exists(self.project_path+"/"+'logs'):
+            os.makedirs(self.project_path+"/"+'logs')
+        handler = TimedRotatingFileHandler(self.project_path+"/"+"logs/wifi_gatherer_lite.log", when='D', interval=1, backupCount=5)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+
+        """
+        read config file
+        """
+        self.config_file = config_file
+        self.snmp_section = section
+        if not os.path.exists(self.project_path+"/"+self.config_file):
+            self.logger.error("cannot find config_file={}".format(self.config_file))
+            raise Exception("config file not found")
+        self.logger.info("section = {}".format(self.snmp_section))
+
+        Config = configparser.ConfigParser()
+        Config.read(self.project_path+"/"+self.config_file)
+        self.logger.info("successfully loaded config_file={}".format(self.config_file))
+
+        try:
+            self.method = Config.get(self.snmp_section, "method")
+            self.source = Config.get(self.snmp_section, "source")
+            self.input_from_file = Config.getboolean(self.snmp_section, "input_from_file")
+            self.input_file_name = Config.get(self.snmp_section, "input_file_name")
+            self.community = Config.get(self.snmp_section, "community")
+            self.switchname = Config.get(self.snmp_section, "switchname")
+            self.oid = Config.get(self.snmp_section, "oid")
+        except Exception as e:
+            self.logger.error("unexpected error while setting configuration from config_file={}, section={}, error={}".format(self.config_file, self.snmp_section, str(e)))
+            raise e
+
+        """
+        optional multi-process parsing of large walks
+        """
+        self.parse_processes = Config.getint(self.snmp_section, "parse_processes", fallback=1)
+        self.parallel_min_bytes = Config.getint(self.snmp_section, "parallel_min_bytes", fallback=8*1024*1024)
+        """
+        optional decoding of a walk over several subtrees with the OID registry (OID_Registry.py)
+        """
+        self.walk_tables = Config.getboolean(self.snmp_section, "walk_tables", fallback=False)
+
+    def _get_data_SMNP(self):
+
+        """
+        This method calls SNMP through subprocess and yields the output lines as they are produced
+        """
+
+        if self.source=="controller":
+            cmd = ['snmpwalk','-v','2c','-c',self.community,'-Onaq',self.switchname,self.oid]
+            try:
+                p = subprocess.Popen(cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    universal_newlines=True)
+            except Exception as e:
+                self.logger.error("unexpected error when running snmpwalk command, error={}".format(str(e)))
+                raise e
+
+            for line in p.stdout:
+                yield line
+            err = p.stderr.read()
+            p.wait()
+
+            if p.returncode != 0:
+                self.logger.error("snmpwalk exited with status %r: %r"% (p.returncode, err))
+                raise Exception('snmpwalk exited with status %r: %r' % (p.returncode, err))
+            self.logger.info("successfully read snmp output")
+
+        else:
+            self.logger.error("currently non implemented AP - SNMP query")
+
+    def _get_data_from_file(self):
+
+        """
+        This method yields the lines of a file with the results of a SNMP query (testing or alternative path)
+        """
+        try:
+            with open(self.project_path+"/"+self.input_file_name, encoding="utf-8") as f:
+                for line in f:
+                    yield line
+            self.logger.info("successfully read file={}".format(self.input_file_name))
+        except Exception as e:
+            self.logger.error("unexpected error while reading from file {}, error={}".format(self.input_file_name, str(e)))
+            raise e
+
+    def _spool_SMNP_to_file(self):
+
+        """
+        This method runs snmpwalk with its stdout redirected to a temporary file, so large walks can be
+        memory-mapped by the parsing workers; the caller removes the file
+        """
+        cmd = ['snmpwalk','-v','2c','-c',self.community,'-Onaq',self.switchname,self.oid]
+        fd, path = tempfile.mkstemp(prefix="snmpwalk-", suffix=".txt")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                p = subprocess.Popen(cmd, stdout=out, stderr=subprocess.PIPE)
+                _, err = p.communicate()
+        except Exception as e:
+            os.remove(path)
+            self.logger.error("unexpected error when running snmpwalk command, error={}".format(str(e)))
+            raise e
+
+        if p.returncode != 0:
+            os.remove(path)
+            self.logger.error("snmpwalk exited with status %r: %r"% (p.returncode, err))
+            raise Exception('snmpwalk exited with status %r: %r' % (p.returncode, err))
+        self.logger.info("successfully spooled snmp output to {}".format(path))
+        return path
+
+    def count_connections_per_AP_parallel(self, processes=None):
+
+        """
+        This method counts the connected devices per AP from file or snmp query, splitting walks larger than
+        parallel_min_bytes into line-aligned chunks parsed by a pool of `processes` workers
+        """
+        processes = processes or self.parse_processes
+        if self.input_from_file:
+            path = self.project_path+"/"+self.input_file_name
+            spooled = False
+        elif self.source=="controller":
+            path = self._spool_SMNP_to_file()
+            spooled = True
+        else:
+            self.logger.error("currently non implemented AP - SNMP query")
+            return Counter()
+
+        try:
+            if processes > 1 and os.path.getsize(path) >= self.parallel_min_bytes:
+                counts = count_connections_parallel(path, processes)
+                self.logger.info("successfully counted connected devices with {} processes".format(processes))
+            else:
+                with open(path, encoding="utf-8") as f:
+                    counts = count_connections_per_AP(f)
+        finally:
+            if spooled:
+                os.remove(path)
+        return counts
+
+    def parse_connection_count_per_AP_parallel(self, processes=None, include_time=True, formatOpt="Melrok"):
+
+        """
+        This method returns the rows of parse_connection_count_per_AP, reading and counting the walk with
+        count_connections_per_AP_parallel
+        """
+        try:
+            counts = self.count_connections_per_AP_parallel(processes)
+            ts = self.get_current_time_utc(formatOpt) if include_time else None
+            rows = connection_count_rows(counts, ts)
+            self.logger.info("successfully counted connected devices")
+        except Exception as e:
+            self.logger.error("unexpected error while counting devices error={}".format(str(e)))
+            raise e
+
+        return rows
+
+    def parse_connection_count_per_AP_from_clients(self, clients, include_time=True, formatOpt="Melrok"):
+
+        """
+        This method returns the rows of parse_connection_count_per_AP from the clients table decoded by the OID
+        registry ({column: list of values}, see OID_Registry.default_registry) instead of from every walk line
+        """
+        try:
+            ts = self.get_current_time_utc(formatOpt) if include_time else None
+            rows = connection_count_rows(Counter(clients["id"]), ts)
+            if rows:
+                self.logger.info("successfully counted connected devices")
+            else:
+                self.logger.warning("data to obtain count from is None, check this")
+        except Exception as e:
+            self.logger.error("unexpected error while counting devices error={}".format(str(e)))
+            raise e
+
+        return rows
+
+    def get_wifi_data(self):
+
+        """
+        This method gets the wi-fi data lines from file or snmp query calling the corresponding methods
+        """
+
+        if self.input_from_file:
+            return self._get_data_from_file() # use sample file to test
+        else:
+            return self._get_data_SMNP() # run real query
+
+    def get_current_time_utc(self, formatOpt="influxDB"):
+
+        """
+        This method generate a timestamp for "now" to attach to the data extracted
+
+        """
+        self.logger.debug("time format = {}".format(formatOpt))
+        if formatOpt=="influxDB":
+            return datetime.datetime.utcnow().strftime("%Y-%m-%dT%-H:%M:%-SZ") # influxDB format
+
+        if formatOpt=="Melrok":
+            return datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S") # Melrok format
+
+    def parse_connection_count_per_AP(self, lines, include_time=True, formatOpt="Melrok"):
+
+        """
+        This method counts the connected devices to each AP and returns a list of (id, value, ts) rows,
+        or (id, value) rows when include_time is False
+        """
+
+        try:
+            ts = self.get_current_time_utc(formatOpt) if include_time else None
+            rows = connection_count_rows(count_connections_per_AP(lines), ts)
+            if rows:
+                self.logger.info("successfully counted connected devices")
+            else:
+                self.logger.warning("data to obtain count from is None, check this")
+        except Exception as e:
+            self.logger.error("unexpected error while counting devices error={}".format(str(e)))
+            raise e
+
+        return rows
+
+if __name__ == '__main__':
+
+    w = wifi_gatherer_lite()
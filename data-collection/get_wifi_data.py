@@ -3,6 +3,7 @@
 
 from WiFi_Gatherer import wifi_gatherer
 from Local_DB import local_db
+from Buffer_Retention import buffer_retention
 import os
 
 project_path = os.path.dirname(os.path.realpath(__file__))
@@ -12,13 +13,26 @@ g = wifi_gatherer(project_path = project_path, config_file="config.ini", section
 g2 = wifi_gatherer(project_path = project_path, config_file="config.ini", section="SNMP_config_cisco")
 engine = local_db(project_path = project_path)
 
-data_aruba = g._get_data_from_file()
-data_aruba = g.parse_connection_count_per_AP(data_aruba, formatOpt="Melrok")
+def count_connections(gatherer):
+    # with walk_tables one walk over several subtrees is decoded by the OID registry and only its clients are counted
+    if gatherer.walk_tables:
+        clients = gatherer.parse_walk_tables()["clients"]
+        return gatherer.parse_connection_count_per_AP(clients[["mac_orig", "id"]], formatOpt="Melrok")
+    # walks are parsed by a pool of processes when parse_processes > 1 in the config section of the controller
+    if gatherer.parse_processes > 1:
+        return gatherer.parse_connection_count_per_AP_parallel(formatOpt="Melrok")
+    data = gatherer._get_data_from_file()
+    return gatherer.parse_connection_count_per_AP(data, formatOpt="Melrok")
 
-data_cisco = g2._get_data_from_file()
-data_cisco = g2.parse_connection_count_per_AP(data_cisco, formatOpt="Melrok")
+data_aruba = count_connections(g)
+data_cisco = count_connections(g2)
 
 engine.save_to_local_DB(data_aruba, mode="append")
 engine.save_to_local_DB(data_cisco, mode="append")
 
 engine.dispose_DB_engine() # need to fix this one
+
+# keep the buffer under its disk quota (quota_mb in [local_db])
+retention = buffer_retention(project_path = project_path)
+retention.enforce_quota()
+retention.dispose()
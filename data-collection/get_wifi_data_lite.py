@@ -0,0 +1,37 @@
+# Same as get_wifi_data.py without pandas/sqlalchemy, for collectors running on small edge devices.
+
+from WiFi_Gatherer_Lite import wifi_gatherer_lite
+from Local_DB_Lite import local_db_lite
+from OID_Registry import default_registry
+from Buffer_Retention import buffer_retention
+import os
+
+project_path = os.path.dirname(os.path.realpath(__file__))
+
+# file get_wifi_data
+g = wifi_gatherer_lite(project_path = project_path, config_file="config.ini", section="SNMP_config_aruba")
+g2 = wifi_gatherer_lite(project_path = project_path, config_file="config.ini", section="SNMP_config_cisco")
+engine = local_db_lite(project_path = project_path)
+
+def count_connections(gatherer):
+    # with walk_tables one walk over several subtrees is decoded by the OID registry and only its clients are counted
+    if gatherer.walk_tables:
+        clients = default_registry().parse_walk(gatherer.get_wifi_data())["clients"]
+        return gatherer.parse_connection_count_per_AP_from_clients(clients, formatOpt="Melrok")
+    # walks are parsed by a pool of processes when parse_processes > 1 in the config section of the controller
+    if gatherer.parse_processes > 1:
+        return gatherer.parse_connection_count_per_AP_parallel(formatOpt="Melrok")
+    return gatherer.parse_connection_count_per_AP(gatherer._get_data_from_file(), formatOpt="Melrok")
+
+data_aruba = count_connections(g)
+data_cisco = count_connections(g2)
+
+engine.save_to_local_DB(data_aruba, mode="append")
+engine.save_to_local_DB(data_cisco, mode="append")
+
+engine.dispose_DB_engine()
+
+# keep the buffer under its disk quota (quota_mb in [local_db])
+retention = buffer_retention(project_path = project_path)
+retention.enforce_quota()
+retention.dispose()
@@ -0,0 +1,55 @@
+# Long-running alternative to push_to_remote_db.py: keeps one remote_db (connection pool, schema checked once at
+# startup) and one local_db for the lifetime of the process and pushes the local buffer every `interval` seconds.
+
+from Local_DB import local_db
+from Remote_DB import remote_db
+from Memory_Profiler import memory_profiler
+import configparser
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import time
+
+project_path = os.path.dirname(os.path.realpath(__file__))
+
+"""set up logging"""
+
+logger = logging.getLogger("push_service")
+logger.setLevel(logging.DEBUG)
+if not os.path.exists(project_path+'/logs'):
+    os.makedirs(project_path+'/logs')
+handler = TimedRotatingFileHandler(project_path+"/logs/push_service.log", when='D', interval=1, backupCount=5)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+config = configparser.ConfigParser()
+config.read(project_path+"/config.ini")
+interval = config.getfloat('push_service', 'interval', fallback=60)
+
+engine = local_db(project_path=project_path)
+remote = remote_db(project_path=project_path)
+profiler = memory_profiler(project_path=project_path, report="memory_report_push")
+batch_size = remote.batch_size
+
+while True:
+    try:
+        remote.ensure_connection()
+        with profiler.stage("push"):
+            try:
+                remote.push_backlog(engine, batch_size=batch_size)
+            except Exception as e:
+                # the connection may have gone stale since the last health check, retry once on a fresh one;
+                # the push resumes after the last committed batch
+                logger.warning("push failed, reconnecting and retrying, error={}".format(str(e)))
+                remote.reconnect()
+                remote.push_backlog(engine, batch_size=batch_size)
+    except Exception as e:
+        logger.error("push failed, will retry in {}s, error={}".format(interval, str(e)))
+    if profiler.over_budget("push") and batch_size > 1:
+        # the batches read from the local db are what the push holds in memory
+        batch_size = max(batch_size // 2, 1)
+        profiler.clear("push")
+        logger.warning("push over its memory budget, batch size reduced to {}".format(batch_size))
+    profiler.write_report("push")
+    time.sleep(interval)
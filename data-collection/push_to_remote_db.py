@@ -3,7 +3,6 @@ from Remote_DB import remote_db
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import os
-from pandas import DataFrame
 from typing import Dict
 
 # @author : Marco Pritoni <mpritoni@lbl.gov>
@@ -24,16 +23,12 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-"""acquire data to push"""
-
-# Get the data (as a DataFrame) from the local database.
-engine = local_db( project_path=project_path )
-data: DataFrame = engine.read_local_DB()
-
 """push to the remote db"""
 
-remote = remote_db()
-remote.push_to_remote_db(data=data)
+# The local buffer is pushed in batches; a checkpoint per remote sink makes a failed push resume where it stopped.
+engine = local_db( project_path=project_path )
+remote = remote_db( project_path=project_path )
+batches = remote.push_backlog(engine)
 # remote.drop_table()
-engine.delete_data_sent(data)
+logger.info("push completed, last batch={}".format(batches))
 print('Success')
@@ -0,0 +1,182 @@
+# Long-running collector: polls every controller listed in [polling] of config.ini at an interval adapted
+# by poll_scheduler to how much the per-AP counts change, and stores the counts in the local db.
+# With [occupancy_api] enabled, the recent counts are also kept in memory and served over HTTP.
+# With [sessions] enabled, the anonymized client lists are sessionized into <table>_sessions and <table>_dwell.
+# With [memory] enabled, every stage of a poll is measured; once a stage exceeds its budget the walks are streamed
+# in chunks instead of being loaded whole.
+
+from WiFi_Gatherer import wifi_gatherer
+from Local_DB import local_db
+from Poll_Scheduler import poll_scheduler
+from Buffer_Retention import buffer_retention
+from Occupancy_Ring import occupancy_ring
+from Occupancy_Server import occupancy_server
+from Sessionizer import device_sessionizer
+from Memory_Profiler import memory_profiler
+import pandas as pd
+import configparser
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import time
+
+project_path = os.path.dirname(os.path.realpath(__file__))
+
+"""set up logging"""
+
+logger = logging.getLogger("collector")
+logger.setLevel(logging.DEBUG)
+if not os.path.exists(project_path+'/logs'):
+    os.makedirs(project_path+'/logs')
+handler = TimedRotatingFileHandler(project_path+"/logs/collector.log", when='D', interval=1, backupCount=5)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+scheduler = poll_scheduler(project_path=project_path, config_file="config.ini")
+gatherers = {
+    section: wifi_gatherer(project_path=project_path, config_file="config.ini", section=section)
+    for section in scheduler.sections
+}
+engine = local_db(project_path=project_path)
+retention = buffer_retention(project_path=project_path)
+profiler = memory_profiler(project_path=project_path)
+
+config = configparser.ConfigParser()
+config.read(project_path+"/config.ini")
+ring = None
+if config.getboolean('occupancy_api', 'enabled', fallback=False):
+    # sized for the fastest polling of every controller, so the window always covers `hours`
+    ring = occupancy_ring(
+        hours=config.getfloat('occupancy_api', 'hours', fallback=6),
+        min_interval=scheduler.min_interval,
+        controllers=len(scheduler.sections),
+    )
+    occupancy_server(
+        ring,
+        project_path=project_path,
+        host=config.get('occupancy_api', 'host', fallback="127.0.0.1"),
+        port=config.getint('occupancy_api', 'port', fallback=8090),
+    ).start_in_thread()
+
+sessionizers = {}
+if config.getboolean('sessions', 'enabled', fallback=False):
+    idle_timeout = config.getfloat('sessions', 'idle_timeout', fallback=900)
+    dwell_bins = [float(b) for b in config.get('sessions', 'dwell_bins', fallback="300, 900, 1800, 3600, 7200, 14400").split(",")]
+    # one sessionizer per controller, so a device is only expired by polls of the controller that reported it
+    sessionizers = {section: device_sessionizer(idle_timeout=idle_timeout, dwell_bins=dwell_bins) for section in scheduler.sections}
+
+
+def read_walk(section, chunksize=None):
+
+    """
+    this function reads the walk of a controller, whole or as an iterator of chunks: the raw (oid_mac_ip, id) lines,
+    or with walk_tables the (mac_orig, id) clients decoded by the OID registry, of which one row is one connection
+    """
+    g = gatherers[section]
+    if g.walk_tables:
+        if chunksize:
+            return (tables["clients"][["mac_orig", "id"]] for tables in g.iter_walk_tables(chunksize=chunksize))
+        return g.parse_walk_tables()["clients"][["mac_orig", "id"]]
+    if chunksize:
+        return g.iter_wifi_data(chunksize=chunksize)
+    return g.get_wifi_data()
+
+
+def observe_clients(section, raw, poll_time):
+
+    """
+    this function feeds the anonymized (id, mac_hashed) clients of a poll, or of a chunk of it, to the sessionizer of
+    the controller; it returns the sessions closed by roaming devices
+    """
+    g = gatherers[section]
+    clients = raw if g.walk_tables else g.parse_mac_address(raw)
+    clients = clients.dropna(subset=["mac_orig", "id"])
+    clients = g.anonymize_MAC_address_df(clients)
+    return sessionizers[section].observe(poll_time, zip(clients["mac_hashed"], clients["id"]))
+
+
+def save_sessions(section, closed, poll_time):
+
+    """
+    this function expires the idle sessions of the controller once its poll is complete and saves the closed sessions
+    and the dwell histograms to the local db
+    """
+    g = gatherers[section]
+    sessionizer = sessionizers[section]
+    closed = closed + sessionizer.expire(poll_time)
+    ts = g.get_current_time_utc("Melrok")
+    if closed:
+        sessions = pd.DataFrame(closed, columns=["token", "id", "first_seen", "last_seen", "dwell"])
+        for column in ["first_seen", "last_seen"]:
+            sessions[column] = pd.to_datetime(sessions[column], unit="s").dt.strftime("%Y%m%d%H%M%S")
+        engine.save_to_local_DB(sessions, mode="append", table=engine.table+"_sessions")
+        dwell = pd.DataFrame(sessionizer.flush_histograms(), columns=["id", "dwell_max", "sessions"])
+        dwell["ts"] = ts
+        engine.save_to_local_DB(dwell, mode="append", table=engine.table+"_dwell")
+    logger.info("{}: {} active devices, {} sessions closed".format(section, sessionizer.active_devices(), len(closed)))
+
+
+def poll(section):
+
+    """
+    this function polls one controller: counts per AP, local db, scheduler, ring buffer and sessions
+    """
+    g = gatherers[section]
+    poll_time = time.time()
+    closed = []
+    # a stage over its memory budget switches the poll to streaming: walk read in chunks, rows saved in batches
+    streaming = profiler.over_budget("read", "count", "sessions", "save")
+    if streaming:
+        partial_counts = []
+        chunks = read_walk(section, chunksize=profiler.chunksize)
+        while True:
+            with profiler.stage("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with profiler.stage("count"):
+                partial_counts.append(g.parse_connection_count_per_AP(chunk, include_time=False))
+            if section in sessionizers:
+                with profiler.stage("sessions"):
+                    closed += observe_clients(section, chunk, poll_time)
+        with profiler.stage("count"):
+            data = g.merge_connection_counts(partial_counts, formatOpt="Melrok")
+    elif g.parse_processes > 1 and section not in sessionizers and not g.walk_tables:
+        # counts only: the pool reads and counts the walk, no dataframe of the whole walk is built
+        with profiler.stage("count"):
+            data = g.parse_connection_count_per_AP_parallel(formatOpt="Melrok")
+    else:
+        with profiler.stage("read"):
+            raw = read_walk(section)
+        with profiler.stage("count"):
+            data = g.parse_connection_count_per_AP(raw, formatOpt="Melrok")
+        if section in sessionizers:
+            with profiler.stage("sessions"):
+                closed = observe_clients(section, raw, poll_time)
+        del raw
+
+    with profiler.stage("save"):
+        engine.save_to_local_DB(data, mode="append", chunksize=profiler.chunksize if streaming else None)
+    counts = dict(zip(data["id"], data["value"])) if not data.empty else {}
+    scheduler.record_poll(section, counts)
+    if ring is not None and not data.empty:
+        ring.append(data["ts"].iloc[0], counts)
+    if section in sessionizers:
+        with profiler.stage("sessions"):
+            save_sessions(section, closed, poll_time)
+
+
+while True:
+    for section in scheduler.due():
+        try:
+            poll(section)
+        except Exception as e:
+            logger.error("poll of {} failed, error={}".format(section, str(e)))
+            scheduler.record_failure(section)
+        profiler.write_report(section)
+    try:
+        retention.enforce_quota()
+    except Exception as e:
+        logger.error("local buffer compaction failed, error={}".format(str(e)))
+    time.sleep(scheduler.seconds_until_next())